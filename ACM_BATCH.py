@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+"""
+Procesamiento por lotes de exportaciones OFM, sin Streamlit.
+
+Cada archivo del directorio de entrada es un campo/activo. Para cada uno se escriben las tablas
+agregadas (CSV) y un reporte HTML autocontenido con los mapas e histogramas de todas las pestañas
+(y opcionalmente imágenes PNG, que requieren el paquete kaleido). Con --publicar cada campo se
+publica además para los visores de la app (ACM_MODO=visor), sin depender de que alguien visite el
+servidor. Los campos se procesan en paralelo en un pool de procesos.
+
+Uso:
+    python ACM_BATCH.py DIRECTORIO_ENTRADA DIRECTORIO_SALIDA [--procesos N] [--meses 12] [--png] [--publicar]
+"""
+
+import argparse
+import glob
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from streamlit.logger import set_log_level
+
+# Fuera del servidor de Streamlit los cachés avisan que no hay runtime; no aplica aquí
+set_log_level("error")
+import ACM_DISTRIBUCION_PROD as acm
+
+INPUT_PATTERNS = ["*.csv", "*.CSV", "*.txt", "*.TXT"]
+
+def find_exports(input_dir):
+    paths = set()
+    for pattern in INPUT_PATTERNS:
+        paths.update(glob.glob(os.path.join(input_dir, pattern)))
+    return sorted(paths)
+
+def write_tables(data, output_dir, meses_corte):
+    # Tablas agregadas del campo
+    tables = {
+        "pozos": data.df_pozos,
+        "acumulada_total": data.df_data,
+        f"acumulada_normalizada_{meses_corte}_meses": acm.cutoff_data(data, meses_corte),
+        "produccion_actual": data.df_diaria_actual,
+        "resumen": data.merged_data,
+    }
+    for name, table in tables.items():
+        table.to_csv(os.path.join(output_dir, f"{name}.csv"), index=False)
+
+def build_report_figures(data, meses_corte, zonas=None, prebinned=True):
+    # Figuras de todas las pestañas para las zonas indicadas (todas por omisión), en el orden de la app
+    static_layers = acm.build_static_layers(data.df_pozos, data.polygon_lats, data.polygon_lons)
+    figures = []
+    for tab_name, specs in acm.TAB_SPECS.items():
+        df_tab, _ = acm.tab_frames(data, tab_name, meses_corte)
+        if zonas:
+            df_tab = df_tab[df_tab["ZONA"].isin(zonas)]
+        for spec in specs:
+            fig_map, fig_histogram = acm.build_column_figures(spec, df_tab, static_layers, data.zoom, prebinned)
+            figures.append((tab_name, spec, fig_map, fig_histogram))
+    return figures
+
+def write_report(figures, path, title, meses_corte):
+    # HTML autocontenido: plotly.js se incluye una sola vez, en la primera figura
+    parts = [f"<html><head><meta charset='utf-8'><title>{title}</title></head>"
+             f"<body style='font-family:Arial;'><h1 style='text-align:center;'>{title}</h1>"]
+    current_tab = None
+    include_plotlyjs = True
+    for tab_name, spec, fig_map, fig_histogram in figures:
+        if tab_name != current_tab:
+            parts.append(f"<h2>{tab_name}</h2>")
+            current_tab = tab_name
+        parts.append(f"<h3>{spec['header'].format(meses=meses_corte)}</h3>")
+        for fig in (fig_map, fig_histogram):
+            parts.append(fig.to_html(full_html=False, include_plotlyjs=include_plotlyjs))
+            include_plotlyjs = False
+    parts.append("</body></html>")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n".join(parts))
+
+def write_images(figures, output_dir):
+    # Imágenes PNG de cada figura; requiere kaleido
+    for _, spec, fig_map, fig_histogram in figures:
+        fig_map.write_image(os.path.join(output_dir, f"mapa_{spec['key']}.png"))
+        fig_histogram.write_image(os.path.join(output_dir, f"histograma_{spec['key']}.png"))
+
+def process_field(path, output_root, meses_corte=acm.MESES_CORTE, png=False, zonas=None, publish=False):
+    # Procesa un campo completo; se ejecuta en un proceso del pool
+    start = time.perf_counter()
+    field = os.path.splitext(os.path.basename(path))[0]
+    # El archivo se hashea y se lee por bloques desde disco, sin cargarlo completo en memoria
+    key = acm.path_hash(path)
+    data = acm.get_processed_data(path, key, label=os.path.basename(path))
+
+    output_dir = os.path.join(output_root, field)
+    os.makedirs(output_dir, exist_ok=True)
+    write_tables(data, output_dir, meses_corte)
+
+    figures = build_report_figures(data, meses_corte, zonas)
+    write_report(figures, os.path.join(output_dir, "reporte.html"), f"DISTRIBUCIÓN DE LA PRODUCCIÓN - {field}", meses_corte)
+    warnings = []
+    if png:
+        try:
+            write_images(figures, output_dir)
+        except (ImportError, ValueError, RuntimeError) as error:
+            warnings.append(f"PNG no generado: {' '.join(str(error).split())}")
+    if publish:
+        # Misma llave y origen que el publicador de la app, de modo que no se publica dos veces
+        acm.publish_dataset(data, key, os.path.basename(path), meses_corte, origen=os.path.abspath(path))
+    return field, len(data.df_pozos), time.perf_counter() - start, warnings
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Reportes por lotes de exportaciones OFM (un archivo por campo).")
+    parser.add_argument("entrada", help="Directorio con las exportaciones OFM (.csv/.txt)")
+    parser.add_argument("salida", help="Directorio donde se escriben las tablas y reportes de cada campo")
+    parser.add_argument("--procesos", type=int, default=os.cpu_count(), help="Procesos en paralelo (por omisión, uno por CPU)")
+    parser.add_argument("--meses", type=int, default=acm.MESES_CORTE, help="Meses para normalizar la acumulada")
+    parser.add_argument("--zonas", nargs="*", help="Zonas a incluir en los mapas (por omisión, todas)")
+    parser.add_argument("--png", action="store_true", help="Exportar también cada figura como PNG (requiere kaleido)")
+    parser.add_argument("--publicar", action="store_true",
+                        help="Publicar también cada campo para los visores de la app (ACM_PUBLISH_DIR)")
+    args = parser.parse_args(argv)
+
+    paths = find_exports(args.entrada)
+    if not paths:
+        print(f"No hay archivos OFM en {args.entrada}", file=sys.stderr)
+        return 1
+    os.makedirs(args.salida, exist_ok=True)
+
+    failures = 0
+    with ProcessPoolExecutor(max_workers=max(1, min(args.procesos, len(paths)))) as pool:
+        futures = {pool.submit(process_field, path, args.salida, args.meses, args.png, args.zonas, args.publicar): path
+                   for path in paths}
+        for future in as_completed(futures):
+            path = futures[future]
+            try:
+                field, n_pozos, seconds, warnings = future.result()
+            except Exception as error:  # Un campo con errores no detiene al resto
+                failures += 1
+                print(f"ERROR {os.path.basename(path)}: {error}", file=sys.stderr)
+                continue
+            print(f"{field}: {n_pozos} pozos en {seconds:.1f} s")
+            for warning in warnings:
+                print(f"  {warning}", file=sys.stderr)
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,273 @@
+# -*- coding: utf-8 -*-
+"""
+Generador de datos OFM sintéticos y banco de pruebas de rendimiento.
+
+Genera exportaciones OFM con el esquema de columnas que espera la app (pozos, disparos por pozo,
+zonas y meses configurables) y mide el tiempo y la memoria máxima de cada etapa: lectura del CSV,
+interpretación de fechas, cada agrupación de process_data, la proyección de coordenadas, la
+construcción de cada mapa/histograma y su serialización a JSON. Los resultados se agregan a un
+archivo JSON Lines con una etiqueta por versión para comparar corridas entre versiones.
+
+Uso:
+    python ACM_BENCHMARK.py [--pozos 100 1000 5000 20000] [--etiqueta v2] [--comparar v1]
+    python ACM_BENCHMARK.py --generar 5000 campo_sintetico.csv
+"""
+
+import argparse
+import datetime
+import io
+import json
+import os
+import subprocess
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+from streamlit.logger import set_log_level
+
+# Fuera del servidor de Streamlit los cachés avisan que no hay runtime; no aplica aquí
+set_log_level("error")
+import ACM_DISTRIBUCION_PROD as acm
+
+BENCHMARK_SIZES = [100, 1000, 5000, 20000]
+BENCHMARK_RESULTS = os.environ.get("ACM_BENCHMARK_RESULTS", "benchmark_resultados.jsonl")
+DIAS_MES = 30.4
+REGRESSION_TOLERANCE = 0.2  # Aumento relativo de tiempo que se reporta como regresión
+REGRESSION_MIN_SECONDS = 0.01  # Diferencias menores se consideran ruido
+
+# GENERADOR DE DATOS OFM SINTÉTICOS
+def generate_ofm(n_pozos, disparos_max=3, n_zonas=5, meses=60, seed=0):
+    # Exportación mensual OFM: cada disparo (POZO ID) produce desde un mes de inicio aleatorio hasta
+    # el final del periodo, con declinación exponencial, ruido y meses cerrados sin producción.
+    rng = np.random.default_rng(seed)
+    fechas = pd.date_range("2015-01-01", periods=meses, freq="MS").strftime(acm.OFM_DATE_FORMAT).to_numpy()
+    zonas = np.array([f"ZONA-{i + 1}" for i in range(n_zonas)])
+
+    # Pozos dentro del polígono del ACM
+    pozos = np.array([f"POZO-{i:05d}" for i in range(n_pozos)])
+    pozo_x = rng.uniform(629300, 643000, n_pozos)
+    pozo_y = rng.uniform(2295100, 2305100, n_pozos)
+    pozo_zona = rng.integers(0, n_zonas, n_pozos)
+
+    # Disparos de cada pozo
+    n_disparos = rng.integers(1, disparos_max + 1, n_pozos)
+    disparo_pozo = np.repeat(np.arange(n_pozos), n_disparos)
+    disparo_num = np.arange(len(disparo_pozo)) - np.repeat(np.cumsum(n_disparos) - n_disparos, n_disparos)
+    disparo_id = np.array([f"{pozos[p]}-{n + 1}" for p, n in zip(disparo_pozo, disparo_num)])
+    inicio = rng.integers(0, meses, len(disparo_pozo))
+    duracion = rng.integers(1, meses - inicio + 1)
+
+    # Filas mensuales de cada disparo
+    fila_disparo = np.repeat(np.arange(len(disparo_pozo)), duracion)
+    offsets = np.cumsum(duracion) - duracion
+    mes = np.arange(len(fila_disparo)) - np.repeat(offsets, duracion)
+    fila_pozo = disparo_pozo[fila_disparo]
+
+    # Gastos diarios (aceite BPD, agua BPD, gas MMcfd); el agua crece con el tiempo
+    gasto_inicial = rng.lognormal(np.log([300.0, 80.0, 0.8]), 0.6, (len(disparo_pozo), 3))
+    declinacion = rng.uniform(0.01, 0.06, len(disparo_pozo))[fila_disparo]
+    gastos = gasto_inicial[fila_disparo] * np.exp(-declinacion * mes)[:, None]
+    gastos[:, 1] *= 1 + declinacion * mes
+    gastos *= rng.uniform(0.8, 1.2, gastos.shape)
+    gastos[rng.random(len(gastos)) < 0.05] = 0
+
+    # Acumuladas por disparo: producción mensual acumulada desde el mes de inicio
+    mensual = gastos * DIAS_MES / np.array([1000.0, 1000.0, 1.0])
+    acumuladas = np.cumsum(mensual, axis=0)
+    acumuladas -= (acumuladas[offsets] - mensual[offsets])[fila_disparo]
+
+    return pd.DataFrame({
+        "POZO": pozos[fila_pozo],
+        "POZO ID": disparo_id[fila_disparo],
+        "ZONA": zonas[pozo_zona[fila_pozo]],
+        "FECHA": fechas[inicio[fila_disparo] + mes],
+        "WGS84_UTMX_OBJETIVO": pozo_x[fila_pozo].round(2),
+        "WGS84_UTMY_OBJETIVO": pozo_y[fila_pozo].round(2),
+        "MESES ACTIVO": mes + 1,
+        "NP Mbbl": acumuladas[:, 0].round(3),
+        "WP Mbbl": acumuladas[:, 1].round(3),
+        "GP MMcf": acumuladas[:, 2].round(3),
+        "ACEITE DIARIO BPD": gastos[:, 0].round(2),
+        "AGUA DIARIA BPD": gastos[:, 1].round(2),
+        "GAS DIARIO MMcfd": gastos[:, 2].round(4),
+        # Columnas que trae la exportación OFM y la app no lee
+        "CAMPO": "SINTETICO",
+        "METODO": np.where(mes % 2 == 0, "FLUYENTE", "BN"),
+    })
+
+# MEDICIÓN POR ETAPA
+class StageRecorder:
+    # Tiempo de reloj de cada etapa y, en una pasada aparte con tracemalloc (que agrega sobrecosto
+    # y distorsionaría los tiempos), la memoria máxima asignada durante la etapa.
+    def __init__(self):
+        self.stages = {}
+        self.track_memory = False
+
+    @contextmanager
+    def stage(self, name):
+        if self.track_memory:
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        result = {}
+        yield result
+        seconds = time.perf_counter() - start
+        record = self.stages.setdefault(name, {"segundos": None, "pico_mb": None, "bytes": None})
+        record["bytes"] = result.get("bytes", record["bytes"])
+        if self.track_memory:
+            record["pico_mb"] = (tracemalloc.get_traced_memory()[1] - base) / 2**20
+        else:
+            # Con repeticiones se conserva el mejor tiempo
+            record["segundos"] = seconds if record["segundos"] is None else min(seconds, record["segundos"])
+
+    def measure_memory(self, run):
+        self.track_memory = True
+        tracemalloc.start()
+        try:
+            run()
+        finally:
+            tracemalloc.stop()
+            self.track_memory = False
+
+def run_pipeline(raw_bytes, recorder, meses_corte=acm.MESES_CORTE):
+    # Mismas etapas que process_data y main(), medidas por separado
+    with recorder.stage("lectura_csv"):
+        df_loaded = acm.read_ofm_csv(io.BytesIO(raw_bytes))
+    fechas = pd.read_csv(io.BytesIO(raw_bytes), usecols=["FECHA"], dtype=str)["FECHA"]
+    with recorder.stage("fechas"):
+        pd.to_datetime(fechas, format=acm.OFM_DATE_FORMAT)
+
+    with recorder.stage("aggregate_shots"):
+        df_disparos, shot_codes = acm.aggregate_shots(df_loaded)
+    with recorder.stage("build_cumulative_index"):
+        acumulada_offsets, acumulada_meses, acumulada_valores, _ = acm.build_cumulative_index(
+            df_loaded, shot_codes, len(df_disparos))
+    with recorder.stage("build_daily_index"):
+        df_diaria_fechas, _, _ = acm.build_daily_index(df_loaded, df_disparos, shot_codes)
+    with recorder.stage("derived_ratios"):
+        acm.add_ratios(df_diaria_fechas)
+    with recorder.stage("rollup_acumulada"):
+        df_data = acm.rollup_acumulada(df_disparos)
+    with recorder.stage("rollup_corte"):
+        df_data_corte = acm.rollup_corte(df_disparos, acumulada_offsets, acumulada_meses, acumulada_valores)
+    with recorder.stage("rollup_pozos"):
+        df_pozos = acm.rollup_pozos(df_disparos, df_loaded.index)
+    with recorder.stage("rollup_resumen"):
+        acm.rollup_resumen(df_disparos)
+    # Proyección en frío: tabla de coordenadas vacía
+    coordinate_table = acm.CoordinateTable(acm.get_coordinate_table().transformer)
+    with recorder.stage("proyeccion"):
+        acm.add_latlon([df_pozos, df_data, df_data_corte, df_diaria_fechas], coordinate_table)
+
+    acm.get_coordinate_table.clear()
+    with recorder.stage("process_data"):
+        data = acm.process_data(df_loaded)
+
+    with recorder.stage("capas_estaticas"):
+        static_layers = acm.build_static_layers(data.df_pozos, data.polygon_lats, data.polygon_lons)
+    # Cada figura de todas las pestañas, con y sin precálculo en el servidor
+    for tab_name, specs in acm.TAB_SPECS.items():
+        df_tab, _ = acm.tab_frames(data, tab_name, meses_corte)
+        for spec in specs:
+            for prebinned, mode in ((True, "servidor"), (False, "cliente")):
+                with recorder.stage(f"mapa/{mode}/{spec['key']}"):
+                    fig_map = acm.plot_density_map(df_tab, static_layers, spec["variable"], 'turbo', data.zoom, prebinned)
+                with recorder.stage(f"histograma/{mode}/{spec['key']}"):
+                    fig_histogram = acm.plot_histogram(df_tab, spec["variable"], spec["title"], spec["color"], prebinned)
+                with recorder.stage(f"json/{mode}/{spec['key']}") as result:
+                    result["bytes"] = len(fig_map.to_json()) + len(fig_histogram.to_json())
+    return len(df_loaded)
+
+# RESULTADOS
+def default_label():
+    # Etiqueta de la corrida: commit actual del repositorio, o la fecha si no hay git
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return datetime.date.today().isoformat()
+
+def stage_family(stage):
+    # Las figuras se resumen por tipo y modo (mapa/servidor, json/cliente, ...)
+    return "/".join(stage.split("/")[:2])
+
+def summarize(records):
+    # Totales por familia de etapas para cada tamaño
+    df = pd.DataFrame(records)
+    df["etapa"] = df["etapa"].map(stage_family)
+    return df.groupby(["pozos", "etapa"], sort=False).agg(
+        filas=("filas", "first"), segundos=("segundos", "sum"), pico_mb=("pico_mb", "max"),
+        mb_json=("bytes", lambda b: b.sum() / 2**20 if b.notna().any() else np.nan)).reset_index()
+
+def load_results(path, label):
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding="utf-8") as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    return [record for record in records if record["etiqueta"] == label]
+
+def compare(current, previous, tolerance=REGRESSION_TOLERANCE):
+    # Razón de tiempos contra la corrida de referencia; devuelve las filas que empeoraron
+    df_current = summarize(current)
+    df_previous = summarize(previous)[["pozos", "etapa", "segundos"]]
+    df = df_current.merge(df_previous, on=["pozos", "etapa"], suffixes=("", "_ref"))
+    df["razon"] = df["segundos"] / df["segundos_ref"]
+    df["regresion"] = (df["razon"] > 1 + tolerance) & (df["segundos"] - df["segundos_ref"] > REGRESSION_MIN_SECONDS)
+    return df
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Banco de pruebas de rendimiento con datos OFM sintéticos.")
+    parser.add_argument("--pozos", type=int, nargs="+", default=BENCHMARK_SIZES, help="Tamaños a medir (número de pozos)")
+    parser.add_argument("--disparos", type=int, default=3, help="Máximo de disparos (POZO ID) por pozo")
+    parser.add_argument("--zonas", type=int, default=5, help="Número de zonas")
+    parser.add_argument("--meses", type=int, default=60, help="Meses del periodo de producción")
+    parser.add_argument("--repeticiones", type=int, default=1, help="Corridas por tamaño (se conserva el mejor tiempo)")
+    parser.add_argument("--sin-memoria", action="store_true", help="Omitir la pasada de medición de memoria")
+    parser.add_argument("--etiqueta", default=None, help="Etiqueta de la versión medida (por omisión, el commit actual)")
+    parser.add_argument("--resultados", default=BENCHMARK_RESULTS, help="Archivo JSON Lines donde se agregan los resultados")
+    parser.add_argument("--comparar", help="Etiqueta de una corrida anterior contra la cual comparar")
+    parser.add_argument("--generar", nargs=2, metavar=("POZOS", "ARCHIVO"),
+                        help="Solo escribir un CSV sintético con ese número de pozos y salir")
+    args = parser.parse_args(argv)
+
+    if args.generar:
+        generate_ofm(int(args.generar[0]), args.disparos, args.zonas, args.meses).to_csv(args.generar[1], index=False)
+        return 0
+
+    label = args.etiqueta or default_label()
+    reference = load_results(args.resultados, args.comparar) if args.comparar else []
+    if args.comparar and not reference:
+        print(f"No hay resultados con la etiqueta {args.comparar} en {args.resultados}", file=sys.stderr)
+        return 1
+
+    records = []
+    timestamp = datetime.datetime.now().isoformat(timespec="seconds")
+    for n_pozos in args.pozos:
+        raw_bytes = generate_ofm(n_pozos, args.disparos, args.zonas, args.meses).to_csv(index=False).encode()
+        recorder = StageRecorder()
+        for _ in range(args.repeticiones):
+            n_filas = run_pipeline(raw_bytes, recorder)
+        if not args.sin_memoria:
+            recorder.measure_memory(lambda: run_pipeline(raw_bytes, recorder))
+        for stage, result in recorder.stages.items():
+            records.append({"etiqueta": label, "fecha": timestamp, "pozos": n_pozos, "filas": n_filas,
+                            "mb_csv": len(raw_bytes) / 2**20, "etapa": stage, **result})
+        print(f"{n_pozos} pozos ({n_filas} filas, {len(raw_bytes) / 2**20:.1f} MB) medidos", file=sys.stderr)
+
+    with open(args.resultados, "a", encoding="utf-8") as f:
+        for record in records:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    with pd.option_context("display.max_rows", None, "display.width", 160, "display.float_format", "{:.3f}".format):
+        if reference:
+            df = compare(records, reference)
+            print(df[["pozos", "etapa", "segundos_ref", "segundos", "razon", "regresion"]].to_string(index=False))
+            return 1 if df["regresion"].any() else 0
+        print(summarize(records).to_string(index=False))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -5,12 +5,216 @@ Created on Thu Oct 31 17:35:14 2024
 @author: juan.melendez
 """
 
+import gzip
+import hashlib
+import io
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+import tracemalloc
+import urllib.parse
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass, fields
+
 import plotly.express as px
 import plotly.graph_objects as go
+import plotly.io as pio
+import numpy as np
 import pandas as pd
 import streamlit as st
+from pandas.api.types import union_categoricals
 from pyproj import Proj, Transformer
 
+# CACHÉ EN DISCO DE LOS RESULTADOS DE process_data
+# Los resultados se guardan en formato columnar (parquet) bajo el hash del archivo cargado,
+# de modo que sobreviven a reinicios de la app. El tamaño total está acotado y se
+# desalojan primero las entradas usadas hace más tiempo (LRU).
+CACHE_DIR = os.environ.get("ACM_CACHE_DIR",
+                           os.path.join(os.path.dirname(os.path.abspath(__file__)), ".acm_cache"))
+CACHE_MAX_MB = float(os.environ.get("ACM_CACHE_MAX_MB", "1024"))
+CACHE_VERSION = "8"  # Incrementar cuando cambie la salida de process_data
+
+# ALMACÉN COMPARTIDO EN MEMORIA
+# Las sesiones que cargan el mismo archivo comparten una sola copia inmutable de los datos procesados.
+# Cada sesión mantiene una referencia al conjunto que está viendo; los conjuntos sin referencias se
+# desalojan (el menos usado primero) cuando el total supera el presupuesto de memoria. Las referencias
+# de sesiones cerradas vencen después de STORE_SESSION_TTL segundos sin actividad.
+STORE_MAX_MB = float(os.environ.get("ACM_STORE_MAX_MB", "2048"))
+STORE_SESSION_TTL = float(os.environ.get("ACM_STORE_SESSION_TTL", "1800"))
+
+# DIAGNÓSTICO DE RENDIMIENTO
+# Registro opcional del tiempo, la memoria máxima y el tamaño de las figuras de cada etapa de una
+# ejecución. Se activa con ACM_DIAGNOSTICO=1 o desde la barra lateral; cada etapa se muestra en un
+# panel plegable y se escribe como una línea JSON en el log "acm.diagnostico". La memoria se mide
+# con tracemalloc, que es de todo el proceso: con varias sesiones simultáneas es aproximada. Como
+# tracemalloc hace más lento todo el servidor, solo está activo mientras alguna ejecución con
+# diagnóstico está abierta. El pico de tracemalloc es uno solo para todo el proceso: las etapas que
+# corren en el pool de figuras, en paralelo, no lo miden (pico_mb vacío) para no reiniciarlo.
+DIAGNOSTICS_ENABLED = os.environ.get("ACM_DIAGNOSTICO", "0") == "1"
+
+diagnostics_logger = logging.getLogger("acm.diagnostico")
+if not diagnostics_logger.handlers:
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    diagnostics_logger.addHandler(_handler)
+    diagnostics_logger.setLevel(logging.INFO)
+    diagnostics_logger.propagate = False
+
+# Registro activo de la ejecución en curso (cada sesión de Streamlit corre en su propio hilo)
+_active_diagnostics = threading.local()
+
+# Ejecuciones con diagnóstico abiertas; la última en cerrar detiene tracemalloc (si lo inició la app)
+_tracing_lock = threading.Lock()
+_tracing_users = 0
+_tracing_owned = False
+
+def _acquire_tracing():
+    global _tracing_users, _tracing_owned
+    with _tracing_lock:
+        if _tracing_users == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _tracing_owned = True
+        _tracing_users += 1
+
+def _release_tracing():
+    global _tracing_users, _tracing_owned
+    with _tracing_lock:
+        _tracing_users -= 1
+        if _tracing_users == 0 and _tracing_owned:
+            tracemalloc.stop()
+            _tracing_owned = False
+
+class Diagnostics:
+    def __init__(self):
+        self.run_id = uuid.uuid4().hex[:8]
+        self.records = []
+        self.started = time.perf_counter()
+        self._local = threading.local()  # Pila de etapas abiertas de cada hilo
+        self.closed = False
+        _acquire_tracing()
+
+    def close(self):
+        # Fin de la ejecución: deja de usar tracemalloc (los registros se conservan)
+        if not self.closed:
+            self.closed = True
+            _release_tracing()
+
+    @property
+    def stack(self):
+        if not hasattr(self._local, "stack"):
+            self._local.stack = []
+        return self._local.stack
+
+    @property
+    def depth(self):
+        return getattr(self._local, "base", 0) + len(self.stack)
+
+    def bind(self, fn):
+        # Ejecuta fn en otro hilo con este registro activo, anidado bajo la etapa abierta actual
+        base = self.depth
+
+        def run(*args, **kwargs):
+            _active_diagnostics.current = self
+            self._local.base = base
+            self._local.pool = True
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                _active_diagnostics.current = None
+        return run
+
+    @contextmanager
+    def stage(self, name, **detail):
+        if getattr(self._local, "pool", False):
+            # En el pool solo se mide el tiempo: el pico de memoria no se mide
+            start = time.perf_counter()
+            self.stack.append(None)
+            try:
+                yield detail
+            finally:
+                self.stack.pop()
+                self.record(name, inicio=start - self.started, segundos=time.perf_counter() - start,
+                            pico_mb=None, nivel=self.depth, **detail)
+            return
+        # Las etapas pueden anidarse: el pico de una etapa interna también cuenta para la externa
+        if self.stack:
+            self.stack[-1]["peak"] = max(self.stack[-1]["peak"], tracemalloc.get_traced_memory()[1])
+        tracemalloc.reset_peak()
+        frame = {"base": tracemalloc.get_traced_memory()[0], "peak": 0}
+        self.stack.append(frame)
+        start = time.perf_counter()
+        try:
+            yield detail
+        finally:
+            seconds = time.perf_counter() - start
+            self.stack.pop()
+            peak = max(frame["peak"], tracemalloc.get_traced_memory()[1])
+            if self.stack:
+                self.stack[-1]["peak"] = max(self.stack[-1]["peak"], peak)
+            self.record(name, inicio=start - self.started, segundos=seconds,
+                        pico_mb=(peak - frame["base"]) / 2**20, nivel=self.depth, **detail)
+
+    def record(self, name, **values):
+        record = {"ejecucion": self.run_id, "etapa": name, **values}
+        self.records.append(record)
+        diagnostics_logger.info(json.dumps(record, ensure_ascii=False, default=str))
+
+def active_diagnostics():
+    return getattr(_active_diagnostics, "current", None)
+
+def diagnostic_stage(name, **detail):
+    # Sin diagnóstico activo no se mide nada; el dict de detalle se puede completar dentro del bloque
+    diagnostics = active_diagnostics()
+    return diagnostics.stage(name, **detail) if diagnostics else nullcontext(detail)
+
+def record_figure_payload(name, *figs):
+    # Tamaño en bytes del JSON que se envía al navegador
+    diagnostics = active_diagnostics()
+    if diagnostics:
+        diagnostics.record(name, inicio=time.perf_counter() - diagnostics.started,
+                           bytes=sum(len(fig.to_json()) for fig in figs), nivel=diagnostics.depth)
+
+def bind_diagnostics(fn):
+    # Propaga el registro activo a las tareas que corren en el pool de figuras
+    diagnostics = active_diagnostics()
+    return diagnostics.bind(fn) if diagnostics else fn
+
+def render_diagnostics(diagnostics):
+    with st.expander("DIAGNÓSTICO DE RENDIMIENTO", expanded=False):
+        df_diagnostics = pd.DataFrame(diagnostics.records).sort_values("inicio", kind="stable")
+        df_diagnostics["etapa"] = ["\u2003" * nivel + etapa for nivel, etapa in
+                                   zip(df_diagnostics["nivel"], df_diagnostics["etapa"])]
+        st.dataframe(df_diagnostics.drop(columns=["ejecucion", "nivel"]), use_container_width=True, hide_index=True)
+
+# PUBLICACIÓN PARA VISORES
+# Con ACM_MODO=visor la app solo muestra reportes publicados: las figuras y tablas de cada pestaña,
+# para todas las zonas y para cada zona por separado, precalculadas como JSON comprimido en
+# PUBLISH_DIR. Una visita cuesta la lectura de un archivo. Con ACM_PUBLICAR=1 y ACM_WATCH_DIR, un
+# hilo de fondo publica cada exportación nueva o modificada del directorio vigilado. Streamlit no
+# ejecuta el script hasta la primera visita, así que el hilo arranca con la primera sesión del
+# servidor; para publicar sin visitas (o sin servidor) se usa `ACM_BATCH.py --publicar`.
+APP_MODE = os.environ.get("ACM_MODO", "completo")  # "completo" o "visor"
+PUBLISH_DIR = os.environ.get("ACM_PUBLISH_DIR",
+                             os.path.join(os.path.dirname(os.path.abspath(__file__)), ".acm_publicado"))
+PUBLISH_ENABLED = os.environ.get("ACM_PUBLICAR", "0") == "1"
+PUBLISH_KEEP = int(os.environ.get("ACM_PUBLISH_KEEP", "12"))  # Reportes publicados que se conservan
+PUBLISH_POLL_SECONDS = float(os.environ.get("ACM_PUBLISH_POLL", "60"))
+ALL_ZONES_LABEL = "TODAS LAS ZONAS"
+
+publish_logger = logging.getLogger("acm.publicacion")
+if not publish_logger.handlers:
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(message)s"))
+    publish_logger.addHandler(_handler)
+    publish_logger.setLevel(logging.INFO)
+    publish_logger.propagate = False
+
 # CONFIGURACIÓN DE LA PÁGINA STREAMLIT
 def configure_page():
     st.set_page_config(page_title="ZONAS ACM", layout="wide")
@@ -23,122 +227,1201 @@ def configure_page():
 
 # CARGA DE ARCHIVO
 def load_data():
-    df_or = st.sidebar.file_uploader("📂", type=["csv", "CSV", "TXT", "txt"])
-    if df_or:
-        return pd.read_csv(df_or, sep=",")
+    # Devuelve el archivo (el archivo subido, o su ruta en el directorio vigilado), su nombre y la llave
+    # de los datos base cuando el archivo es un incremento mensual que se integra a una carga anterior
+    base_key = None
+    datasets = list_cached_datasets() if HISTORY_BACKEND == "memoria" else {}
+    if datasets and st.sidebar.toggle("ACTUALIZACIÓN INCREMENTAL", value=False,
+                                      help="Agrega un archivo con solo los meses nuevos a datos ya procesados"):
+        base_key = st.sidebar.selectbox("DATOS BASE", list(datasets), format_func=datasets.get)
+    if WATCH_DIR:
+        # Exportaciones recurrentes: por omisión, la más reciente del directorio vigilado
+        paths = list_watched_files(WATCH_DIR)
+        if paths:
+            path = st.sidebar.selectbox("ARCHIVO OFM", paths, format_func=os.path.basename)
+            return path, os.path.basename(path), base_key
+    else:
+        df_or = st.sidebar.file_uploader("📂", type=["csv", "CSV", "TXT", "txt"])
+        if df_or:
+            return df_or, df_or.name, base_key
+    # Sin archivo la sesión deja de usar el conjunto que tenía en memoria
+    if "session_id" in st.session_state:
+        get_dataset_store().release(st.session_state["session_id"])
     st.error("ARCHIVO NO CARGADO ❗❗")
     st.stop()
 
+# LECTURA DEL ARCHIVO OFM
+# Solo se leen las columnas que usa process_data, con tipos compactos y la fecha interpretada
+# durante la lectura. El archivo se procesa por bloques para acotar la memoria máxima.
+OFM_DATE_FORMAT = '%d/%m/%Y %H:%M'
+OFM_CATEGORY_COLUMNS = ["POZO", "POZO ID", "ZONA"]
+OFM_FLOAT32_COLUMNS = ['MESES ACTIVO', 'NP Mbbl', 'WP Mbbl', 'GP MMcf',
+                       'ACEITE DIARIO BPD', 'AGUA DIARIA BPD', 'GAS DIARIO MMcfd']
+OFM_FLOAT64_COLUMNS = ["WGS84_UTMX_OBJETIVO", "WGS84_UTMY_OBJETIVO"]  # UTM requiere doble precisión
+OFM_COLUMNS = OFM_CATEGORY_COLUMNS + ['FECHA'] + OFM_FLOAT64_COLUMNS + OFM_FLOAT32_COLUMNS
+OFM_CSV_ENGINE = os.environ.get("ACM_CSV_ENGINE", "c")  # "c" o "pyarrow"
+OFM_CHUNK_ROWS = int(os.environ.get("ACM_CSV_CHUNK_ROWS", "500000"))
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+    import pyarrow.dataset as pa_ds
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow es opcional para la lectura y para la historia en Parquet
+    pa = pa_csv = pa_ds = pq = None
+
+def read_ofm_csv(source, engine=None, chunk_rows=None):
+    return _concat_chunks(list(read_ofm_chunks(source, engine, chunk_rows)))
+
+def read_ofm_chunks(source, engine=None, chunk_rows=None):
+    # Bloques compactos del archivo OFM; source es una ruta o un objeto tipo archivo
+    engine = engine or OFM_CSV_ENGINE
+    chunk_rows = chunk_rows or OFM_CHUNK_ROWS
+    
+    # Validar el encabezado antes de leer el archivo completo
+    if hasattr(source, "seek"):
+        source.seek(0)
+    header = pd.read_csv(source, sep=",", nrows=0).columns
+    if hasattr(source, "seek"):
+        source.seek(0)
+    missing = [col for col in OFM_COLUMNS if col not in header]
+    if missing:
+        raise ValueError(f"El archivo no contiene las columnas requeridas: {', '.join(missing)}")
+    
+    if engine == "pyarrow" and pa_csv is not None:
+        chunks = _read_chunks_pyarrow(source, chunk_rows)
+    else:
+        chunks = _read_chunks_pandas(source, chunk_rows)
+    return (_compact_chunk(chunk) for chunk in chunks)
+
+def _read_chunks_pandas(source, chunk_rows):
+    dtypes = {col: "float32" for col in OFM_FLOAT32_COLUMNS}
+    dtypes.update({col: "float64" for col in OFM_FLOAT64_COLUMNS})
+    dtypes.update({col: "category" for col in OFM_CATEGORY_COLUMNS})
+    return pd.read_csv(source, sep=",", usecols=OFM_COLUMNS, dtype=dtypes, parse_dates=['FECHA'],
+                       date_format=OFM_DATE_FORMAT, chunksize=chunk_rows)
+
+def _read_chunks_pyarrow(source, chunk_rows):
+    column_types = {col: pa.float32() for col in OFM_FLOAT32_COLUMNS}
+    column_types.update({col: pa.float64() for col in OFM_FLOAT64_COLUMNS})
+    column_types.update({col: pa.dictionary(pa.int32(), pa.string()) for col in OFM_CATEGORY_COLUMNS})
+    column_types['FECHA'] = pa.timestamp("s")
+    reader = pa_csv.open_csv(
+        source,
+        # Tamaño de bloque aproximado a partir de ~100 bytes por fila
+        read_options=pa_csv.ReadOptions(block_size=max(1 << 20, chunk_rows * 100)),
+        convert_options=pa_csv.ConvertOptions(include_columns=OFM_COLUMNS, column_types=column_types,
+                                              timestamp_parsers=[OFM_DATE_FORMAT]))
+    for batch in reader:
+        yield batch.to_pandas()
+
+def _compact_chunk(chunk):
+    for col in OFM_CATEGORY_COLUMNS:
+        if not isinstance(chunk[col].dtype, pd.CategoricalDtype):
+            chunk[col] = chunk[col].astype("category")
+    return chunk
+
+def _concat_chunks(chunks):
+    if not chunks:
+        return pd.DataFrame({col: pd.Series(dtype="float64") for col in OFM_COLUMNS})
+    # Cada bloque trae sus propias categorías: se unifican sin pasar por cadenas de texto
+    columns = {}
+    for col in OFM_COLUMNS:
+        if col in OFM_CATEGORY_COLUMNS:
+            columns[col] = pd.Categorical(union_categoricals([chunk[col] for chunk in chunks], sort_categories=True))
+        else:
+            columns[col] = np.concatenate([chunk[col].to_numpy() for chunk in chunks])
+    df_loaded = pd.DataFrame(columns)
+    # MESES ACTIVO es entero cuando no tiene valores vacíos
+    if df_loaded['MESES ACTIVO'].notna().all():
+        df_loaded['MESES ACTIVO'] = df_loaded['MESES ACTIVO'].astype("int16")
+    return df_loaded
+
+def source_size(source):
+    # Tamaño en bytes de un archivo cargado (bytes o archivo subido) o del directorio vigilado (ruta)
+    if isinstance(source, bytes):
+        return len(source)
+    if isinstance(source, str):
+        return os.path.getsize(source)
+    return source.getbuffer().nbytes
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def source_key(path, size, mtime, base_key=None):
+    # Hash de un archivo del directorio vigilado; se recalcula solo si cambia su tamaño o fecha
+    return path_hash(path, base_key)
+
+def file_hash(raw_bytes, base_key=None):
+    # Hash del contenido del archivo (incluye la versión del caché para invalidarlo al cambiar el cálculo).
+    # Un incremento se identifica por los datos base más su propio contenido.
+    prefix = CACHE_VERSION if base_key is None else f"{CACHE_VERSION}+{base_key}"
+    digest = hashlib.sha256(prefix.encode())
+    digest.update(raw_bytes)  # bytes o memoryview, sin copiar el contenido
+    return digest.hexdigest()
+
+def upload_key(uploaded_file, base_key=None):
+    # Hash de un archivo subido; se calcula una sola vez por archivo y sesión (file_id cambia con cada
+    # subida), de modo que los reruns por filtros no vuelven a recorrer ni copiar el archivo
+    hashes = st.session_state.setdefault("hash_archivos", {})
+    llave = (uploaded_file.file_id, base_key)
+    if llave not in hashes:
+        buffer = uploaded_file.getbuffer()
+        try:
+            hashes[llave] = file_hash(buffer, base_key)
+        finally:
+            buffer.release()
+    return hashes[llave]
+
+def load_cached_results(key):
+    path = os.path.join(CACHE_DIR, key)
+    meta_path = os.path.join(path, "meta.json")
+    if not os.path.exists(meta_path):
+        return None
+    try:
+        with open(meta_path, encoding="utf-8") as f:
+            values = json.load(f)
+        values.pop("_etiqueta", None)
+        values.pop("_base", None)
+        for field in fields(ProcessedData):
+            if field.type is pd.DataFrame:
+                values[field.name] = pd.read_parquet(os.path.join(path, f"{field.name}.parquet"))
+            elif field.type is np.ndarray:
+                values[field.name] = np.load(os.path.join(path, f"{field.name}.npy"))
+            elif field.type is tuple:
+                values[field.name] = tuple(values[field.name])
+        results = ProcessedData(**values)
+        # Marcar la entrada como usada recientemente (orden LRU)
+        os.utime(meta_path)
+    except (OSError, ValueError, KeyError, TypeError):
+        # Entrada corrupta o incompleta: se descarta y se recalcula
+        shutil.rmtree(path, ignore_errors=True)
+        return None
+    return results
+
+def store_cached_results(key, results, label=None, base=True):
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    # Escribir en un directorio temporal y renombrar al final para no dejar entradas a medias
+    tmp_path = os.path.join(CACHE_DIR, f".tmp-{key}-{uuid.uuid4().hex}")
+    os.makedirs(tmp_path)
+    try:
+        # base=False marca resultados parciales (una selección de zonas) que no sirven como datos base
+        meta = {"_etiqueta": label or key[:12], "_base": base}
+        for field in fields(ProcessedData):
+            value = getattr(results, field.name)
+            if field.type is pd.DataFrame:
+                value.to_parquet(os.path.join(tmp_path, f"{field.name}.parquet"))
+            elif field.type is np.ndarray:
+                np.save(os.path.join(tmp_path, f"{field.name}.npy"), value)
+            else:
+                meta[field.name] = list(value) if field.type is tuple else value
+        with open(os.path.join(tmp_path, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, os.path.join(CACHE_DIR, key))
+    except OSError:
+        # Otra sesión ya guardó la misma entrada (o el disco no está disponible)
+        shutil.rmtree(tmp_path, ignore_errors=True)
+    evict_cache(CACHE_MAX_MB * 1024 * 1024)
+
+def evict_cache(max_bytes):
+    # Desalojar las entradas menos usadas recientemente hasta quedar dentro del límite
+    entries = []
+    for name in os.listdir(CACHE_DIR):
+        path = os.path.join(CACHE_DIR, name)
+        meta_path = os.path.join(path, "meta.json")
+        if name.startswith(".") or not os.path.exists(meta_path):
+            continue
+        size = sum(entry.stat().st_size for entry in os.scandir(path) if entry.is_file())
+        entries.append((os.path.getmtime(meta_path), size, path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        shutil.rmtree(path, ignore_errors=True)
+        total -= size
+
+def list_cached_datasets():
+    # Datos procesados disponibles en el caché, del más reciente al más antiguo: {llave: etiqueta}
+    datasets = []
+    if os.path.isdir(CACHE_DIR):
+        for name in os.listdir(CACHE_DIR):
+            meta_path = os.path.join(CACHE_DIR, name, "meta.json")
+            if name.startswith(".") or not os.path.exists(meta_path):
+                continue
+            try:
+                with open(meta_path, encoding="utf-8") as f:
+                    meta = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if not meta.get("_base", True):
+                continue
+            label = meta.get("_etiqueta", name[:12])
+            datasets.append((os.path.getmtime(meta_path), name, label))
+    return {name: label for _, name, label in sorted(datasets, reverse=True)}
+
+def get_processed_data(source, key, base_key=None, label=None):
+    # Reutilizar los resultados si este archivo ya fue procesado antes. source es una ruta (se lee por
+    # bloques desde disco, sin cargar el archivo completo en memoria), un archivo subido o bytes
+    with diagnostic_stage("get_processed_data") as detail:
+        results = load_cached_results(key)
+        detail["cache"] = results is not None
+        if results is None:
+            with diagnostic_stage("read_ofm_csv", bytes=source_size(source)):
+                df_loaded = read_ofm_csv(io.BytesIO(source) if isinstance(source, bytes) else source)
+            if base_key is None:
+                with diagnostic_stage("process_data", filas=len(df_loaded)):
+                    results = process_data(df_loaded)
+            else:
+                # Integrar el incremento al estado agregado de la carga base
+                base = load_cached_results(base_key)
+                if base is None:
+                    raise ValueError("Los datos base ya no están disponibles; cargue el archivo completo.")
+                with diagnostic_stage("append_delta"):
+                    results = append_delta(base, df_loaded)
+            with diagnostic_stage("store_cached_results"):
+                store_cached_results(key, results, label)
+    return results
+
+def dataset_nbytes(data):
+    # Memoria ocupada por los dataframes y arreglos de un ProcessedData
+    total = 0
+    for field in fields(data):
+        value = getattr(data, field.name)
+        if isinstance(value, pd.DataFrame):
+            total += int(value.memory_usage(deep=True, index=True).sum())
+        elif isinstance(value, np.ndarray):
+            total += value.nbytes
+    return total
+
+def freeze_dataset(data):
+    # Los arreglos compartidos entre sesiones quedan de solo lectura
+    for field in fields(data):
+        value = getattr(data, field.name)
+        if isinstance(value, np.ndarray):
+            value.setflags(write=False)
+    return data
+
+class DatasetStore:
+    def __init__(self, max_bytes, session_ttl):
+        self.max_bytes = max_bytes
+        self.session_ttl = session_ttl
+        self.entries = OrderedDict()  # llave -> {"data", "nbytes", "sessions": {sesión: última actividad}}
+        self.sessions = {}  # sesión -> llave del conjunto que está viendo
+        self.loading = {}  # llave -> candado de la carga en curso
+        self.lock = threading.Lock()
+
+    def acquire(self, key, session_id, load):
+        # Devuelve el conjunto compartido de key y registra la referencia de la sesión; si no está en
+        # memoria lo carga una sola vez aunque varias sesiones lo pidan a la vez
+        with self.lock:
+            entry = self.entries.get(key)
+            key_lock = None if entry else self.loading.setdefault(key, threading.Lock())
+        if key_lock is not None:
+            try:
+                with key_lock:
+                    with self.lock:
+                        entry = self.entries.get(key)
+                    if entry is None:
+                        data = freeze_dataset(load())
+                        entry = {"data": data, "nbytes": dataset_nbytes(data), "sessions": {}}
+            finally:
+                with self.lock:
+                    self.loading.pop(key, None)
+        with self.lock:
+            entry = self.entries.setdefault(key, entry)
+            self._release(session_id)
+            entry["sessions"][session_id] = time.monotonic()
+            self.sessions[session_id] = key
+            self.entries.move_to_end(key)
+            self._evict()
+        return entry["data"]
+
+    def release(self, session_id):
+        with self.lock:
+            self._release(session_id)
+
+    def usage(self):
+        # Número de conjuntos en memoria y bytes que ocupan
+        with self.lock:
+            return len(self.entries), sum(entry["nbytes"] for entry in self.entries.values())
+
+    def _release(self, session_id):
+        key = self.sessions.pop(session_id, None)
+        if key in self.entries:
+            self.entries[key]["sessions"].pop(session_id, None)
+
+    def _evict(self):
+        # Vencer referencias inactivas y desalojar conjuntos sin referencias hasta cumplir el presupuesto;
+        # los conjuntos en uso nunca se desalojan
+        now = time.monotonic()
+        for entry in self.entries.values():
+            for session_id, last_seen in list(entry["sessions"].items()):
+                if now - last_seen > self.session_ttl:
+                    del entry["sessions"][session_id]
+                    self.sessions.pop(session_id, None)
+        total = sum(entry["nbytes"] for entry in self.entries.values())
+        for key in list(self.entries):
+            if total <= self.max_bytes:
+                break
+            if not self.entries[key]["sessions"]:
+                total -= self.entries.pop(key)["nbytes"]
+
+@st.cache_resource
+def get_dataset_store():
+    return DatasetStore(STORE_MAX_MB * 2**20, STORE_SESSION_TTL)
+
+# HISTORIA MENSUAL EN PARQUET (BACKEND OPCIONAL)
+# Con ACM_BACKEND=parquet cada exportación se ingiere una sola vez, por bloques, a un conjunto Parquet
+# particionado por ZONA. Cada selección de zonas se procesa leyendo solo sus particiones, de modo que
+# la historia completa del campo nunca se carga en memoria. Con ACM_WATCH_DIR las exportaciones se
+# toman de un directorio local en lugar de subirlas.
+# El conjunto solo está indexado por ZONA: no hay orden ni particiones por FECHA, porque ninguna
+# consulta filtra la historia por fecha. Las fotos diarias de cualquier mes salen del índice por fecha
+# en memoria (build_daily_index) de la selección de zonas ya procesada.
+HISTORY_BACKEND = os.environ.get("ACM_BACKEND", "memoria")  # "memoria" o "parquet"
+HISTORY_DIR = os.environ.get("ACM_HISTORY_DIR",
+                             os.path.join(os.path.dirname(os.path.abspath(__file__)), ".acm_historia"))
+WATCH_DIR = os.environ.get("ACM_WATCH_DIR")
+WATCH_EXTENSIONS = (".csv", ".txt")
+HIVE_NULL_PARTITION = "__HIVE_DEFAULT_PARTITION__"  # Partición donde pyarrow escribe las filas con ZONA vacía
+NO_ZONE_LABEL = "(SIN ZONA)"  # Cómo se ofrece esa partición en el selector de zonas
+
+def path_hash(path, base_key=None):
+    # Igual que file_hash, leyendo el archivo por bloques
+    prefix = CACHE_VERSION if base_key is None else f"{CACHE_VERSION}+{base_key}"
+    digest = hashlib.sha256(prefix.encode())
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 24), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def subset_key(dataset_key, zonas):
+    # Llave de los resultados de una selección de zonas de un archivo
+    return hashlib.sha256(f"{dataset_key}|{json.dumps(sorted(zonas))}".encode()).hexdigest()
+
+def list_watched_files(watch_dir):
+    # Exportaciones del directorio vigilado, de la más reciente a la más antigua
+    files = [entry for entry in os.scandir(watch_dir)
+             if entry.is_file() and entry.name.lower().endswith(WATCH_EXTENSIONS)]
+    return [entry.path for entry in sorted(files, key=lambda entry: entry.stat().st_mtime, reverse=True)]
+
+def ingest_history(source, key):
+    # Escribe la historia del archivo en HISTORY_DIR/key; si ya fue ingerida no hace nada
+    if pq is None:
+        raise ValueError("El backend parquet requiere el paquete pyarrow.")
+    path = os.path.join(HISTORY_DIR, key)
+    if os.path.isdir(path):
+        return path
+    os.makedirs(HISTORY_DIR, exist_ok=True)
+    tmp_path = os.path.join(HISTORY_DIR, f".tmp-{key}-{uuid.uuid4().hex}")
+    if isinstance(source, bytes):
+        source = io.BytesIO(source)
+    try:
+        for i, chunk in enumerate(read_ofm_chunks(source)):
+            chunk[OFM_CATEGORY_COLUMNS] = chunk[OFM_CATEGORY_COLUMNS].astype(object)
+            pq.write_to_dataset(pa.Table.from_pandas(chunk, preserve_index=False), tmp_path,
+                                partition_cols=["ZONA"], basename_template=f"parte-{i}-{{i}}.parquet")
+        os.replace(tmp_path, path)
+    except OSError:
+        # Otra sesión ya ingirió el mismo archivo
+        if not os.path.isdir(path):
+            raise
+    finally:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+    return path
+
+class HistoryDataset:
+    # Consultas sobre la historia ingerida; el filtro de zonas se resuelve en pyarrow (particiones)
+    # antes de pasar a pandas
+    def __init__(self, path):
+        self.path = path
+        self.dataset = pa_ds.dataset(path, format="parquet",
+                                     partitioning=pa_ds.partitioning(pa.schema([("ZONA", pa.string())]), flavor="hive"))
+        self.lock = threading.Lock()
+        self._wells = None
+
+    def zones(self):
+        # Zonas ingeridas; las filas sin ZONA se ofrecen como NO_ZONE_LABEL
+        names = (urllib.parse.unquote(name.split("=", 1)[1]) for name in os.listdir(self.path)
+                 if name.startswith("ZONA="))
+        return sorted(NO_ZONE_LABEL if name == HIVE_NULL_PARTITION else name for name in names)
+
+    def load(self, zonas=None):
+        # Tabla mensual (mismos tipos que read_ofm_csv) de las zonas indicadas; la partición por omisión
+        # se lee como ZONA nula, así que NO_ZONE_LABEL se resuelve con is_null en lugar de isin
+        condition = None
+        if zonas is not None:
+            condition = pa_ds.field("ZONA").isin(pa.array([zona for zona in zonas if zona != NO_ZONE_LABEL],
+                                                          type=pa.string()))
+            if NO_ZONE_LABEL in zonas:
+                condition = condition | pa_ds.field("ZONA").is_null()
+        table = self.dataset.to_table(columns=OFM_COLUMNS, filter=condition)
+        return _concat_chunks([_compact_chunk(table.to_pandas())])
+
+    def wells(self):
+        # Todos los pozos con coordenadas (capa fija de los mapas), leyendo solo esas columnas
+        with self.lock:
+            if self._wells is None:
+                df_wells = (self.dataset.to_table(columns=WELL_KEYS).to_pandas()
+                            .drop_duplicates(ignore_index=True))
+                add_latlon([df_wells], get_coordinate_table())
+                self._wells = df_wells
+            return self._wells
+
+@st.cache_resource(max_entries=8)
+def get_history(key, _source):
+    # Historia ingerida de un archivo (compartida por todas las sesiones)
+    with diagnostic_stage("ingest_history"):
+        return HistoryDataset(ingest_history(_source, key))
+
+def zone_values(zonas):
+    # Valores de ZONA de una selección de zonas de la historia (NO_ZONE_LABEL son las filas vacías)
+    return [np.nan if zona == NO_ZONE_LABEL else zona for zona in zonas]
+
+def get_subset_data(history, key, zonas, label=None):
+    # Resultados de process_data de una selección de zonas, leyendo solo sus particiones
+    results = load_cached_results(key)
+    if results is None:
+        with diagnostic_stage("load_history", zonas=len(zonas)):
+            df_loaded = history.load(zonas)
+        with diagnostic_stage("process_data", filas=len(df_loaded)):
+            results = process_data(df_loaded)
+        store_cached_results(key, results, f"{label} [{', '.join(sorted(zonas))}]", base=False)
+    return results
+
+# PROYECCIÓN DE COORDENADAS UTM A LAT/LONG
+UTM_COLUMNS = ["WGS84_UTMX_OBJETIVO", "WGS84_UTMY_OBJETIVO"]
+COORDINATE_TABLE_MAX_ROWS = 1_000_000
+
+class CoordinateTable:
+    # Tabla memoizada de coordenadas proyectadas: cada par (UTMX, UTMY) se transforma una sola vez
+    # y se reutiliza en los reruns y en cargas posteriores de archivos del mismo campo.
+    def __init__(self, transformer):
+        self.transformer = transformer
+        self.table = pd.DataFrame({"WGS84_UTMX_OBJETIVO": [], "WGS84_UTMY_OBJETIVO": [],
+                                   "Latitude": [], "Longitude": []}, dtype="float64")
+        self.lock = threading.Lock()
+
+    def project(self, coords):
+        # Devuelve un dataframe alineado con coords con las columnas Latitude y Longitude
+        coords = coords[UTM_COLUMNS].astype("float64").reset_index(drop=True)
+        # Los pares vacíos o no finitos no se proyectan ni se guardan (quedan con Latitude/Longitude NaN),
+        # de modo que las llaves de la tabla son únicas y el merge final conserva las filas de coords
+        unique_coords = coords[np.isfinite(coords.to_numpy()).all(axis=1)].drop_duplicates()
+        with self.lock:
+            known = unique_coords.merge(self.table, on=UTM_COLUMNS, how="left", indicator=True)
+            found = (known.pop("_merge") == "both").to_numpy()
+            missing = known.loc[~found, UTM_COLUMNS]
+            if len(missing):
+                # Una sola llamada vectorizada al transformador para todos los pares nuevos
+                lon, lat = self.transformer.transform(missing["WGS84_UTMX_OBJETIVO"].to_numpy(),
+                                                      missing["WGS84_UTMY_OBJETIVO"].to_numpy())
+                if len(self.table) + len(missing) > COORDINATE_TABLE_MAX_ROWS:
+                    # La tabla se reinicia conservando los pares que usa esta llamada
+                    self.table = known.loc[found].reset_index(drop=True)
+                self.table = pd.concat([self.table, missing.assign(Latitude=lat, Longitude=lon)],
+                                       ignore_index=True)
+            table = self.table
+        projected = coords.merge(table, on=UTM_COLUMNS, how="left")[["Latitude", "Longitude"]]
+        assert len(projected) == len(coords)
+        return projected
+
+@st.cache_resource
+def get_coordinate_table():
+    # Definir el transformador para convertir de UTM a Lat/Long
+    transformer = Transformer.from_crs(
+        "epsg:32614",  # UTM Zone 14N WGS84 (ajustar según tu zona UTM)
+        "epsg:4326",   # WGS84
+        always_xy=True
+    )
+    return CoordinateTable(transformer)
+
+def add_latlon(frames, coordinate_table):
+    # Proyectar en bloque las coordenadas de todos los dataframes y asignar Latitude/Longitude a cada uno
+    projected = coordinate_table.project(pd.concat([frame[UTM_COLUMNS] for frame in frames], ignore_index=True))
+    start = 0
+    for frame in frames:
+        end = start + len(frame)
+        frame["Latitude"] = projected["Latitude"].to_numpy()[start:end]
+        frame["Longitude"] = projected["Longitude"].to_numpy()[start:end]
+        start = end
+
+# ÍNDICE ESPACIAL DE LOS POZOS
+# Malla regular en coordenadas UTM: los pozos de cada celda quedan en un tramo contiguo de un arreglo
+# ordenado, de modo que cada polígono solo prueba los pozos de las celdas que toca su rectángulo
+# envolvente. La prueba punto-en-polígono es vectorizada sobre pozos y aristas (regla par-impar, que
+# también resuelve los huecos de los polígonos).
+ACM_POLYGON_UTM = [
+    (629254, 2294990),
+    (629205, 2305136),
+    (643050, 2305249),
+    (643137, 2295102),
+    (629254, 2294990)
+]
+GRID_WELLS_PER_CELL = 16
+POLYGON_BLOCK_CELLS = 1_000_000  # Pares pozo-arista evaluados por bloque en la prueba punto-en-polígono
+
+def points_in_polygon(x, y, rings):
+    # Máscara de los puntos (x, y) dentro de un polígono dado como lista de anillos (vx, vy)
+    inside = np.zeros(len(x), dtype=bool)
+    if not len(x):
+        return inside
+    x, y = np.asarray(x, dtype="float64"), np.asarray(y, dtype="float64")
+    block = max(1, POLYGON_BLOCK_CELLS // len(x))
+    for vx, vy in rings:
+        # Cada arista va del vértice anterior al actual; el anillo se cierra solo
+        vx, vy = np.asarray(vx, dtype="float64"), np.asarray(vy, dtype="float64")
+        qx, qy = np.roll(vx, 1), np.roll(vy, 1)
+        for start in range(0, len(vx), block):
+            xi, yi = vx[start:start + block, None], vy[start:start + block, None]
+            xj, yj = qx[start:start + block, None], qy[start:start + block, None]
+            crosses = (yi > y) != (yj > y)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                x_cross = xi + (y - yi) * (xj - xi) / (yj - yi)
+            inside ^= np.logical_xor.reduce(crosses & (x < x_cross), axis=0)
+    return inside
+
+class WellGrid:
+    def __init__(self, x, y, wells_per_cell=GRID_WELLS_PER_CELL):
+        self.x = np.asarray(x, dtype="float64")
+        self.y = np.asarray(y, dtype="float64")
+        # Los pozos sin coordenadas quedan fuera de la malla (y de cualquier polígono)
+        valid = np.flatnonzero(np.isfinite(self.x) & np.isfinite(self.y))
+        if len(valid):
+            self.x0, self.y0 = self.x[valid].min(), self.y[valid].min()
+            width, height = self.x[valid].max() - self.x0, self.y[valid].max() - self.y0
+        else:
+            self.x0 = self.y0 = width = height = 0.0
+        # Celdas cuadradas con unos wells_per_cell pozos en promedio
+        n_cells = max(1.0, len(valid) / wells_per_cell)
+        self.size = max(np.sqrt(width * height / n_cells), max(width, height) / n_cells, 1e-6)
+        self.nx = int(width // self.size) + 1
+        self.ny = int(height // self.size) + 1
+        cells = self._cell_x(self.x[valid]) * self.ny + self._cell_y(self.y[valid])
+        order = np.argsort(cells, kind="stable")
+        self.order = valid[order]
+        self.offsets = np.searchsorted(cells[order], np.arange(self.nx * self.ny + 1))
+
+    def _cell_x(self, x):
+        return np.clip((x - self.x0) // self.size, 0, self.nx - 1).astype(np.int64)
+
+    def _cell_y(self, y):
+        return np.clip((y - self.y0) // self.size, 0, self.ny - 1).astype(np.int64)
+
+    def candidates(self, xmin, ymin, xmax, ymax):
+        # Pozos de las celdas que tocan el rectángulo; cada columna de celdas es un solo tramo
+        if (xmax < self.x0 or ymax < self.y0 or xmin > self.x0 + self.nx * self.size
+                or ymin > self.y0 + self.ny * self.size):
+            return self.order[:0]
+        (cx0, cx1), (cy0, cy1) = self._cell_x(np.array([xmin, xmax])), self._cell_y(np.array([ymin, ymax]))
+        columns = np.arange(cx0, cx1 + 1) * self.ny
+        starts, ends = self.offsets[columns + cy0], self.offsets[columns + cy1 + 1]
+        return np.concatenate([self.order[start:end] for start, end in zip(starts, ends)])
+
+    def inside(self, polygons):
+        # Máscara de los pozos dentro de alguno de los polígonos (cada uno, una lista de anillos)
+        mask = np.zeros(len(self.x), dtype=bool)
+        for rings in polygons:
+            vx = np.concatenate([np.asarray(ring_x, dtype="float64") for ring_x, _ in rings])
+            vy = np.concatenate([np.asarray(ring_y, dtype="float64") for _, ring_y in rings])
+            idx = self.candidates(vx.min(), vy.min(), vx.max(), vy.max())
+            idx = idx[~mask[idx]]
+            mask[idx[points_in_polygon(self.x[idx], self.y[idx], rings)]] = True
+        return mask
+
+@st.cache_resource(max_entries=16)
+def get_well_grid(dataset_key, _df_wells):
+    # Índice espacial de los pozos de un archivo (compartido por todas las sesiones)
+    return WellGrid(_df_wells["WGS84_UTMX_OBJETIVO"].to_numpy(), _df_wells["WGS84_UTMY_OBJETIVO"].to_numpy())
+
+def acm_polygons():
+    x, y = zip(*ACM_POLYGON_UTM)
+    return [[(np.array(x, dtype="float64"), np.array(y, dtype="float64"))]]
+
+def _geojson_polygons(obj):
+    # Anillos de cada polígono de un objeto GeoJSON (colección, elemento o geometría)
+    kind = obj.get("type")
+    if kind == "FeatureCollection":
+        for feature in obj.get("features", []):
+            yield from _geojson_polygons(feature)
+    elif kind == "Feature":
+        yield from _geojson_polygons(obj.get("geometry") or {})
+    elif kind == "GeometryCollection":
+        for geometry in obj.get("geometries", []):
+            yield from _geojson_polygons(geometry)
+    elif kind == "Polygon":
+        yield obj["coordinates"]
+    elif kind == "MultiPolygon":
+        yield from obj["coordinates"]
+
+@st.cache_data(max_entries=16, show_spinner=False)
+def read_polygons(raw_bytes, file_name):
+    # Polígonos en UTM de un archivo GeoJSON (lon/lat WGS84) o CSV con las columnas POLIGONO,
+    # WGS84_UTMX_OBJETIVO y WGS84_UTMY_OBJETIVO (vértices en orden, un anillo por POLIGONO)
+    try:
+        if file_name.lower().endswith(".csv"):
+            df_vertices = pd.read_csv(io.BytesIO(raw_bytes), usecols=["POLIGONO"] + UTM_COLUMNS)
+            polygons = [[(group["WGS84_UTMX_OBJETIVO"].to_numpy(dtype="float64"),
+                          group["WGS84_UTMY_OBJETIVO"].to_numpy(dtype="float64"))]
+                        for _, group in df_vertices.groupby("POLIGONO", sort=False)]
+        else:
+            rings_lonlat = [[np.asarray(ring, dtype="float64")[:, :2] for ring in polygon]
+                            for polygon in _geojson_polygons(json.loads(raw_bytes))]
+            # Una sola llamada al transformador (inversa: lon/lat a UTM) para todos los vértices
+            vertices = np.concatenate([ring for rings in rings_lonlat for ring in rings] or [np.empty((0, 2))])
+            utm_x, utm_y = get_coordinate_table().transformer.transform(vertices[:, 0], vertices[:, 1],
+                                                                        direction="INVERSE")
+            polygons, start = [], 0
+            for rings in rings_lonlat:
+                polygon = []
+                for ring in rings:
+                    polygon.append((utm_x[start:start + len(ring)], utm_y[start:start + len(ring)]))
+                    start += len(ring)
+                polygons.append(polygon)
+    except (ValueError, KeyError, TypeError, IndexError) as error:
+        raise ValueError(f"ARCHIVO DE POLÍGONOS NO VÁLIDO: {error}") from error
+    polygons = [rings for rings in polygons if rings and all(len(ring_x) >= 3 for ring_x, _ in rings)]
+    if not polygons:
+        raise ValueError("EL ARCHIVO NO CONTIENE POLÍGONOS")
+    return polygons
+
+# MOTOR DE AGREGACIÓN
+SHOT_KEYS = ["POZO", "POZO ID", "ZONA", "WGS84_UTMX_OBJETIVO", "WGS84_UTMY_OBJETIVO"]
+WELL_KEYS = ["POZO", "ZONA", "WGS84_UTMX_OBJETIVO", "WGS84_UTMY_OBJETIVO"]
+CUM_COLUMNS = ['NP Mbbl', 'WP Mbbl', 'GP MMcf']
+RATE_COLUMNS = ['ACEITE DIARIO BPD', 'AGUA DIARIA BPD', 'GAS DIARIO MMcfd']
+RATIO_COLUMNS = ['RGA Mcfb', 'CORTE DE AGUA %', 'RAA bbl/bbl']
+MESES_CORTE = 12  # Corte de normalización por omisión
+MAX_MESES_ACTIVO = np.iinfo(np.int32).max  # Mayor MESES ACTIVO que admite el índice de acumuladas
+
+@dataclass
+class ProcessedData:
+    # Resultados de process_data; el caché en disco guarda cada campo según su tipo
+    df_pozos: pd.DataFrame
+    df_data: pd.DataFrame
+    df_data_corte: pd.DataFrame
+    merged_data: pd.DataFrame
+    df_disparos: pd.DataFrame    # Tabla compacta por disparo (una fila por POZO ID)
+    acumulada_offsets: np.ndarray  # Primera celda de cada disparo en acumulada_meses (más el total al final)
+    acumulada_meses: np.ndarray  # MESES ACTIVO de cada celda (disparo, mes), crecientes dentro de cada disparo
+    acumulada_valores: np.ndarray  # (3, celdas): NP/WP/GP de cada disparo a ese MESES ACTIVO
+    acumulada_cortes: np.ndarray  # Valores de MESES ACTIVO alcanzados por al menos un disparo
+    df_diaria_fechas: pd.DataFrame  # Gastos diarios y relaciones por pozo y fecha, ordenados por FECHA
+    diaria_fechas: np.ndarray    # Fechas únicas de df_diaria_fechas
+    diaria_offsets: np.ndarray   # Fila inicial de cada fecha (más el total de filas al final)
+    df_historia: pd.DataFrame    # Historia mensual ordenada por POZO, POZO ID y FECHA
+    historia_offsets: np.ndarray  # Fila inicial de cada POZO (código de categoría) en df_historia
+    polygon_lats: tuple
+    polygon_lons: tuple
+    zoom: int
+    n_filas: int                 # Filas del historial procesado (posición de las filas de un incremento)
+
+    @property
+    def df_diaria_actual(self):
+        # Producción diaria a la fecha de corte OFM (la última fecha del archivo)
+        if len(self.diaria_fechas) == 0:
+            return self.df_diaria_fechas
+        return daily_snapshot(self, self.diaria_fechas[-1])
+
+def aggregate_shots(df_loaded):
+    # Calcula en una sola pasada agrupada todas las reducciones por disparo (POZO ID): máximos
+    # de acumuladas y MESES ACTIVO. También devuelve el número de disparo de cada fila, que
+    # reutilizan el índice de acumuladas y el índice por fecha sin volver a factorizar las llaves.
+    columns = {key: df_loaded[key] for key in SHOT_KEYS}
+    columns['MESES ACTIVO'] = df_loaded['MESES ACTIVO']
+    columns.update({col: df_loaded[col] for col in CUM_COLUMNS})
+    # Posición de la primera fila de cada disparo (conserva el orden de aparición de los pozos)
+    columns['FILA'] = pd.RangeIndex(len(df_loaded))
+    
+    grouped = pd.DataFrame(columns).groupby(SHOT_KEYS, sort=True, dropna=False, observed=True)
+    df_disparos = (grouped.agg({**{col: 'max' for col in columns if col not in SHOT_KEYS}, 'FILA': 'min'})
+                   .reset_index())
+    shot_codes = grouped.ngroup().to_numpy()
+    return df_disparos, shot_codes
+
+def build_cumulative_index(df_loaded, shot_codes, n_shots):
+    # Acumuladas de cada disparo a cada valor de MESES ACTIVO que tiene registrado, en arreglos
+    # compactos por disparo (una celda por par disparo-mes, los meses de cada disparo contiguos y
+    # ordenados), para responder cualquier corte de normalización sin reagrupar la tabla mensual.
+    # El tamaño es el número de celdas, no disparos por el mayor MESES ACTIVO.
+    codes, meses, valid = _cumulative_cells(df_loaded, shot_codes)
+    dtype = np.result_type(*(df_loaded[col].dtype for col in CUM_COLUMNS))  # float32 con read_ofm_csv
+    valores = np.stack([df_loaded[col].to_numpy(dtype=dtype)[valid] for col in CUM_COLUMNS])
+    codes, meses, valores = _reduce_cells(codes, meses, valores)
+    offsets = np.searchsorted(codes, np.arange(n_shots + 1))
+    return offsets, meses, valores, np.unique(meses)
+
+def _cumulative_cells(df_loaded, shot_codes):
+    # Celdas (disparo, MESES ACTIVO) de cada fila; se omiten los meses vacíos, no enteros o fuera
+    # del rango de int32
+    meses = df_loaded['MESES ACTIVO'].to_numpy(dtype="float64")
+    valid = np.isfinite(meses) & (meses >= 0) & (meses <= MAX_MESES_ACTIVO) & (meses == np.floor(meses))
+    return shot_codes[valid], meses[valid].astype("int32"), valid
+
+def _reduce_cells(codes, meses, valores):
+    # Ordena las celdas por disparo y mes y deja una por par con el máximo de sus filas
+    # (fmax ignora los NaN igual que el max() de pandas)
+    llaves = (codes.astype("int64") << 32) | meses
+    order = np.argsort(llaves, kind="stable")
+    llaves = llaves[order]
+    inicio = np.flatnonzero(np.r_[True, llaves[1:] != llaves[:-1]]) if len(llaves) else np.array([], dtype="int64")
+    valores = np.fmax.reduceat(valores[:, order], inicio, axis=1) if len(inicio) else valores
+    llaves = llaves[inicio]
+    return llaves >> 32, (llaves & 0xFFFFFFFF).astype("int32"), valores
+
+def _search_cells(meses, inicio, fin, objetivos):
+    # Búsqueda binaria vectorizada de cada objetivo en su tramo [inicio, fin) de meses; devuelve la
+    # posición donde está (o donde debería insertarse) y si el mes ya existe en el tramo
+    lo, hi = inicio.astype("int64"), fin.astype("int64")
+    if len(meses) == 0:
+        return lo, np.zeros(len(lo), dtype=bool)
+    activos = lo < hi
+    while activos.any():
+        mid = (lo + hi) // 2
+        menor = meses[np.minimum(mid, len(meses) - 1)] < objetivos
+        lo = np.where(activos & menor, mid + 1, lo)
+        hi = np.where(activos & ~menor, mid, hi)
+        activos = lo < hi
+    existe = (lo < fin) & (meses[np.minimum(lo, len(meses) - 1)] == objetivos)
+    return lo, existe
+
+def merge_cumulative_cells(offsets, meses, valores, codes, delta_meses, delta_valores, n_shots):
+    # Integra las celdas de un incremento: las que ya existen se actualizan con fmax y las nuevas se
+    # insertan en su posición dentro del tramo de su disparo (los disparos nuevos quedan al final)
+    codes, delta_meses, delta_valores = _reduce_cells(codes, delta_meses, delta_valores.astype(valores.dtype))
+    limites = np.concatenate([offsets, np.full(n_shots + 1 - len(offsets), offsets[-1])])
+    posiciones, existe = _search_cells(meses, limites[codes], limites[codes + 1], delta_meses)
+    
+    valores = valores.copy()
+    valores[:, posiciones[existe]] = np.fmax(valores[:, posiciones[existe]], delta_valores[:, existe])
+    nuevas = ~existe
+    meses = np.insert(meses, posiciones[nuevas], delta_meses[nuevas])
+    valores = np.insert(valores, posiciones[nuevas], delta_valores[:, nuevas], axis=1)
+    # Cada disparo se desplaza por las celdas nuevas de los disparos anteriores
+    insertadas = np.bincount(codes[nuevas], minlength=n_shots)
+    offsets = limites + np.concatenate([[0], np.cumsum(insertadas)])
+    return offsets, meses, valores
+
+def available_cutoffs(data):
+    # Valores de MESES ACTIVO alcanzados por al menos un disparo
+    return data.acumulada_cortes.tolist()
+
+def _valid_shots(df_disparos, keys):
+    # Las agrupaciones por pozo descartan las llaves vacías (como groupby con dropna=True)
+    return df_disparos.dropna(subset=keys)
+
+def rollup_acumulada(df_disparos):
+    # Totalizar la producción acumulada por pozo
+    df_validos = _valid_shots(df_disparos, SHOT_KEYS)
+    return df_validos.groupby(WELL_KEYS + ['MESES ACTIVO'], observed=True)[CUM_COLUMNS].sum().reset_index()
+
+def rollup_corte(df_disparos, acumulada_offsets, acumulada_meses, acumulada_valores, meses_corte=MESES_CORTE):
+    # Totalizar por pozo la acumulada de los disparos que alcanzaron meses_corte meses,
+    # buscando la celda meses_corte dentro del tramo de cada disparo
+    posiciones, presente = _search_cells(acumulada_meses, acumulada_offsets[:-1], acumulada_offsets[1:],
+                                         meses_corte)
+    presente = presente & df_disparos[SHOT_KEYS].notna().all(axis=1).to_numpy()
+    
+    df_corte = df_disparos.loc[presente, WELL_KEYS]
+    df_corte['MESES ACTIVO'] = pd.Series(meses_corte, index=df_corte.index, dtype=df_disparos['MESES ACTIVO'].dtype)
+    df_corte[CUM_COLUMNS] = acumulada_valores[:, posiciones[presente]].T
+    return df_corte.groupby(WELL_KEYS + ['MESES ACTIVO'], observed=True)[CUM_COLUMNS].sum().reset_index()
+
+def cutoff_data(data, meses_corte):
+    # Acumulada normalizada por pozo a cualquier corte, con coordenadas geográficas
+    if meses_corte == MESES_CORTE:
+        return data.df_data_corte
+    df_data_corte = rollup_corte(data.df_disparos, data.acumulada_offsets, data.acumulada_meses,
+                                 data.acumulada_valores, meses_corte)
+    add_latlon([df_data_corte], get_coordinate_table())
+    return df_data_corte
+
+def build_daily_index(df_loaded, df_disparos, shot_codes):
+    # Gastos diarios totalizados por pozo para cada fecha, ordenados por FECHA y con la fila inicial
+    # de cada fecha, de modo que la foto de cualquier mes se obtiene con una búsqueda binaria y un
+    # corte de filas en lugar de filtrar la tabla mensual.
+    df_diaria_fechas = _daily_rows(df_loaded, df_disparos, shot_codes)
+    diaria_fechas, diaria_offsets = np.unique(df_diaria_fechas['FECHA'].to_numpy(), return_index=True)
+    diaria_offsets = np.append(diaria_offsets, len(df_diaria_fechas))
+    return df_diaria_fechas, diaria_fechas, diaria_offsets
+
+def _daily_rows(df_loaded, df_disparos, shot_codes):
+    df_rates = pd.DataFrame({'DISPARO': shot_codes, 'FECHA': df_loaded['FECHA'],
+                             **{col: df_loaded[col] for col in RATE_COLUMNS}})
+    # Producción diaria por disparo a cada fecha
+    df_rates = df_rates.groupby(['DISPARO', 'FECHA'], sort=False)[RATE_COLUMNS].max().reset_index()
+    
+    # Totalizar por pozo la producción diaria de sus disparos. Los pozos se numeran en el orden de
+    # WELL_KEYS para que el resultado quede ordenado por FECHA y después por pozo.
+    df_validos = _valid_shots(df_disparos, SHOT_KEYS)
+    well_codes = pd.Series(-1, index=df_disparos.index)
+    well_codes[df_validos.index] = df_validos.groupby(WELL_KEYS, observed=True).ngroup()
+    df_rates['POZO_N'] = well_codes.to_numpy()[df_rates['DISPARO'].to_numpy()]
+    df_rates = df_rates[df_rates['POZO_N'] >= 0]
+    df_rates = df_rates.groupby(['FECHA', 'POZO_N'])[RATE_COLUMNS].sum().reset_index()
+    
+    df_pozos_n = df_validos[WELL_KEYS].drop_duplicates().sort_values(WELL_KEYS)
+    df_diaria_fechas = df_pozos_n.iloc[df_rates['POZO_N'].to_numpy()].reset_index(drop=True)
+    df_diaria_fechas['FECHA'] = df_rates['FECHA'].to_numpy()
+    df_diaria_fechas[RATE_COLUMNS] = df_rates[RATE_COLUMNS].to_numpy()
+    return df_diaria_fechas
+
+def add_ratios(df):
+    # Relación gas-aceite, corte de agua y relación agua-aceite de cada fila en una sola pasada
+    # vectorizada. Sin gasto de aceite (o de líquido) la relación no está definida y queda en NaN.
+    oil = df['ACEITE DIARIO BPD'].to_numpy(dtype="float64")
+    water = df['AGUA DIARIA BPD'].to_numpy(dtype="float64")
+    gas = df['GAS DIARIO MMcfd'].to_numpy(dtype="float64")
+    liquid = oil + water
+    with np.errstate(divide="ignore", invalid="ignore"):
+        df['RGA Mcfb'] = np.where(oil > 0, gas * 1000 / oil, np.nan).astype("float32")
+        df['CORTE DE AGUA %'] = np.where(liquid > 0, water * 100 / liquid, np.nan).astype("float32")
+        df['RAA bbl/bbl'] = np.where(oil > 0, water / oil, np.nan).astype("float32")
+    return df
+
+def daily_snapshot(data, fecha):
+    # Producción diaria por pozo a una fecha: O(log n) para ubicarla más el tamaño de la foto
+    fecha = np.datetime64(pd.Timestamp(fecha))
+    i = np.searchsorted(data.diaria_fechas, fecha)
+    if i == len(data.diaria_fechas) or data.diaria_fechas[i] != fecha:
+        return data.df_diaria_fechas.iloc[:0]
+    return data.df_diaria_fechas.iloc[data.diaria_offsets[i]:data.diaria_offsets[i + 1]].reset_index(drop=True)
+
+# Índice de series por pozo: la historia mensual ordenada por pozo, con la fila inicial de cada uno,
+# de modo que la consulta de un pozo es un corte contiguo y no un recorrido de toda la tabla
+HISTORY_COLUMNS = ["POZO", "POZO ID", "FECHA"] + CUM_COLUMNS + RATE_COLUMNS
+
+def build_well_index(df_loaded):
+    df_historia = df_loaded[HISTORY_COLUMNS]
+    order = np.lexsort((df_historia['FECHA'].to_numpy(), df_historia['POZO ID'].cat.codes.to_numpy(),
+                        df_historia['POZO'].cat.codes.to_numpy()))
+    df_historia = df_historia.take(order).reset_index(drop=True)
+    # Los códigos de POZO quedan ordenados: la fila inicial de cada código se ubica por búsqueda binaria
+    codes = df_historia['POZO'].cat.codes.to_numpy()
+    historia_offsets = np.searchsorted(codes, np.arange(len(df_historia['POZO'].cat.categories) + 1))
+    return df_historia, historia_offsets
+
+def merge_well_index(df_historia, delta_historia):
+    # Inserta las filas de un incremento en un índice por pozo ya ordenado sin reordenar la historia:
+    # solo se ordena el incremento y cada fila se ubica por búsqueda binaria, O(d log n). Escribir el
+    # resultado sí es O(n): np.insert copia cada columna de la historia (una copia secuencial, no un
+    # ordenamiento). El resultado es el mismo que build_well_index sobre la historia y el incremento
+    # concatenados
+    df_historia = df_historia.copy(deep=False)
+    _unify_categories([df_historia, delta_historia], ["POZO", "POZO ID"])
+    delta_historia, _ = build_well_index(delta_historia)
+    
+    keys_h = [df_historia[col].cat.codes.to_numpy() for col in ("POZO", "POZO ID")] + [df_historia['FECHA'].to_numpy()]
+    keys_d = [delta_historia[col].cat.codes.to_numpy() for col in ("POZO", "POZO ID")] + [delta_historia['FECHA'].to_numpy()]
+    # Las fechas se comparan como enteros con NaT al final, igual que en lexsort
+    nat = np.iinfo(np.int64).min
+    as_int = lambda fechas: np.where(fechas.view("int64") == nat, np.iinfo(np.int64).max, fechas.view("int64"))
+    keys_d[2] = as_int(keys_d[2])
+    
+    # Primera fila de la historia mayor que cada fila del incremento (las iguales quedan antes, como
+    # en un ordenamiento estable)
+    n = len(df_historia)
+    lo = np.zeros(len(delta_historia), dtype=np.int64)
+    hi = np.full(len(delta_historia), n, dtype=np.int64)
+    active = lo < hi
+    while active.any():
+        mid = (lo + hi) // 2
+        at = np.minimum(mid, n - 1)
+        pozo, pozo_id, fecha = keys_h[0][at], keys_h[1][at], as_int(keys_h[2][at])
+        before = (pozo < keys_d[0]) | ((pozo == keys_d[0]) & (
+            (pozo_id < keys_d[1]) | ((pozo_id == keys_d[1]) & (fecha <= keys_d[2]))))
+        lo = np.where(active & before, mid + 1, lo)
+        hi = np.where(active & ~before, mid, hi)
+        active = lo < hi
+    
+    columns = {}
+    for col in HISTORY_COLUMNS:
+        if isinstance(df_historia[col].dtype, pd.CategoricalDtype):
+            codes = np.insert(df_historia[col].cat.codes.to_numpy(), lo, delta_historia[col].cat.codes.to_numpy())
+            columns[col] = pd.Categorical.from_codes(codes, dtype=df_historia[col].dtype)
+        else:
+            columns[col] = np.insert(df_historia[col].to_numpy(), lo, delta_historia[col].to_numpy())
+    df_historia = pd.DataFrame(columns)
+    codes = df_historia['POZO'].cat.codes.to_numpy()
+    historia_offsets = np.searchsorted(codes, np.arange(len(df_historia['POZO'].cat.categories) + 1))
+    return df_historia, historia_offsets
+
+def well_history(data, pozo):
+    # Historia mensual de un pozo (todos sus disparos)
+    categories = data.df_historia['POZO'].cat.categories
+    if pozo not in categories:
+        return data.df_historia.iloc[:0]
+    code = categories.get_loc(pozo)
+    return data.df_historia.iloc[data.historia_offsets[code]:data.historia_offsets[code + 1]]
+
+def rollup_pozos(df_disparos, index):
+    # Lista de pozos con coordenadas en el orden de aparición del archivo
+    df_pozos = (df_disparos.groupby(["POZO", "WGS84_UTMX_OBJETIVO", "WGS84_UTMY_OBJETIVO", "ZONA"],
+                                    sort=False, dropna=False, observed=True)['FILA'].min()
+                .reset_index().sort_values('FILA'))
+    df_pozos.index = index[df_pozos.pop('FILA').to_numpy()]
+    return df_pozos
+
+def rollup_resumen(df_disparos):
+    # Tabla resumen por pozo: suma de las acumuladas de sus disparos y meses activo máximos
+    df_validos = _valid_shots(df_disparos, ["POZO", "POZO ID", "ZONA"])
+    df_max = df_validos.groupby(["POZO", "POZO ID", "ZONA"], observed=True)[CUM_COLUMNS + ['MESES ACTIVO']].max()
+    return df_max.groupby(["POZO", "ZONA"], observed=True).agg(
+        {**{col: 'sum' for col in CUM_COLUMNS}, 'MESES ACTIVO': 'max'}).reset_index()
+
 def process_data(df_loaded):
 
     if df_loaded is None:
         raise ValueError("df_loaded no cargó correctamente.")
 
-    # Convertir la columna de fecha a formato datetime
-    df_loaded['FECHA'] = pd.to_datetime(df_loaded['FECHA'], format='%d/%m/%Y %H:%M')    
+    # Convertir la columna de fecha a formato datetime (read_ofm_csv ya la entrega convertida)
+    if not pd.api.types.is_datetime64_any_dtype(df_loaded['FECHA']):
+        df_loaded['FECHA'] = pd.to_datetime(df_loaded['FECHA'], format=OFM_DATE_FORMAT)
 
-    df_acumulada_tabla_max = df_loaded.groupby(["POZO", "POZO ID", "ZONA"])[['NP Mbbl','WP Mbbl','GP MMcf']].max().reset_index()
-    df_acumulada_tabla_sum = df_acumulada_tabla_max.groupby(["POZO", "ZONA"])[['NP Mbbl','WP Mbbl','GP MMcf']].sum().reset_index()
+    # Un solo recorrido agrupado de la tabla mensual; todo lo demás se deriva de la tabla por disparo
+    with diagnostic_stage("aggregate_shots"):
+        df_disparos, shot_codes = aggregate_shots(df_loaded)
+    with diagnostic_stage("build_cumulative_index"):
+        acumulada_offsets, acumulada_meses, acumulada_valores, acumulada_cortes = build_cumulative_index(
+            df_loaded, shot_codes, len(df_disparos))
+    with diagnostic_stage("build_daily_index"):
+        df_diaria_fechas, diaria_fechas, diaria_offsets = build_daily_index(df_loaded, df_disparos, shot_codes)
+    with diagnostic_stage("derived_ratios"):
+        add_ratios(df_diaria_fechas)
+    with diagnostic_stage("build_well_index"):
+        df_historia, historia_offsets = build_well_index(df_loaded)
     
-    df_meses_max = df_loaded.groupby(["POZO", "POZO ID", "ZONA"])[['MESES ACTIVO']].max().reset_index()
-    df_meses_sum = df_meses_max.groupby(["POZO", "ZONA"])[['MESES ACTIVO']].max().reset_index()
+    with diagnostic_stage("rollups"):
+        df_data = rollup_acumulada(df_disparos)
+        df_data_corte = rollup_corte(df_disparos, acumulada_offsets, acumulada_meses, acumulada_valores)
+        df_pozos = rollup_pozos(df_disparos, df_loaded.index)
+        merged_data = rollup_resumen(df_disparos)
     
-    merged_df = pd.merge(df_acumulada_tabla_sum, df_meses_sum, on=["POZO", "ZONA"], how="inner")
+    # Proyectar una sola vez cada par de coordenadas UTM único de los cuatro dataframes
+    coordinate_table = get_coordinate_table()
+    with diagnostic_stage("proyeccion"):
+        add_latlon([df_pozos, df_data, df_data_corte, df_diaria_fechas], coordinate_table)
     
+    # Convertir las coordenadas UTM del polígono ACM
+    polygon_latlon = coordinate_table.project(pd.DataFrame(ACM_POLYGON_UTM, columns=UTM_COLUMNS))
+    polygon_latlon = list(zip(polygon_latlon["Latitude"], polygon_latlon["Longitude"]))
+    
+    # Separar las coordenadas en latitudes y longitudes
+    polygon_lats, polygon_lons = zip(*polygon_latlon)
+    zoom = 1    
+  
+    return ProcessedData(df_pozos=df_pozos, df_data=df_data, df_data_corte=df_data_corte, merged_data=merged_data,
+                         df_disparos=df_disparos, acumulada_offsets=acumulada_offsets,
+                         acumulada_meses=acumulada_meses, acumulada_valores=acumulada_valores,
+                         acumulada_cortes=acumulada_cortes,
+                         df_diaria_fechas=df_diaria_fechas, diaria_fechas=diaria_fechas,
+                         diaria_offsets=diaria_offsets, df_historia=df_historia, historia_offsets=historia_offsets,
+                         polygon_lats=polygon_lats, polygon_lons=polygon_lons, zoom=zoom, n_filas=len(df_loaded))
 
+# ACTUALIZACIÓN INCREMENTAL
+# Un archivo con solo los meses nuevos se integra al estado agregado de una carga anterior: se
+# actualizan los máximos de los disparos afectados, sus celdas de acumuladas y las fotos diarias de
+# las fechas nuevas. La lectura, la agrupación y las búsquedas son proporcionales al incremento, pero
+# el resultado no lo es: el estado es inmutable (se comparte entre sesiones), así que la historia por
+# pozo, las fotos diarias y las celdas de acumuladas se copian completas con el incremento insertado,
+# y store_cached_results vuelve a escribir todas las tablas en el caché en disco. Un incremento cuesta
+# por lo tanto una copia secuencial del estado más la escritura del caché, O(historia), en lugar de
+# reordenar y reagrupar el historial completo; guardar la historia por segmentos no lo evitaría
+# mientras las fotos diarias y las acumuladas se sigan copiando.
 
-    #DATAFRAME CON DATOS ACUMULADA TOTAL
-    # Filtrar los valores máximos de los disparos por pozo
-    df_acumulada_max = df_loaded.groupby(["POZO", "POZO ID", "ZONA","WGS84_UTMX_OBJETIVO", "WGS84_UTMY_OBJETIVO"])[['MESES ACTIVO','NP Mbbl','WP Mbbl','GP MMcf']].max().reset_index()
-    # Totalizar los la producion acumulada por pozo
-    df_acumulada_totalizada = df_acumulada_max.groupby(["POZO", "ZONA","WGS84_UTMX_OBJETIVO", "WGS84_UTMY_OBJETIVO",'MESES ACTIVO'])[['NP Mbbl','WP Mbbl','GP MMcf']].sum().reset_index()
+def _unify_categories(frames, columns):
+    # Misma lista ordenada de categorías en todos los dataframes para poder concatenarlos
+    for col in columns:
+        if not all(isinstance(frame[col].dtype, pd.CategoricalDtype) for frame in frames):
+            continue
+        # Unión vectorizada; si el incremento no trae categorías nuevas la lista no cambia
+        categories = frames[0][col].cat.categories
+        for frame in frames[1:]:
+            categories = categories.union(frame[col].cat.categories)
+        if not categories.is_monotonic_increasing:
+            categories = categories.sort_values()
+        dtype = pd.CategoricalDtype(categories)
+        for frame in frames:
+            frame[col] = frame[col].astype(dtype)
+
+def append_delta(data, df_delta):
+    if not pd.api.types.is_datetime64_any_dtype(df_delta['FECHA']):
+        df_delta['FECHA'] = pd.to_datetime(df_delta['FECHA'], format=OFM_DATE_FORMAT)
     
+    # El incremento solo puede traer fechas que no estén ya en el estado
+    fechas_delta = np.unique(df_delta['FECHA'].dropna().to_numpy().astype(data.diaria_fechas.dtype))
+    repetidas = np.intersect1d(fechas_delta, data.diaria_fechas)
+    if len(repetidas):
+        raise ValueError("El archivo incremental contiene fechas ya cargadas: "
+                         + ", ".join(pd.Timestamp(fecha).strftime("%m/%Y") for fecha in repetidas[:5]))
     
-    #DATAFRAME CON DATOS A 6 MESES
-    df_corte = df_loaded[df_loaded['MESES ACTIVO'] == 12]
+    # Máximos por disparo del incremento
+    delta_disparos, delta_codes = aggregate_shots(df_delta)
+    delta_disparos['FILA'] += data.n_filas
+    df_disparos = data.df_disparos.copy()
+    _unify_categories([df_disparos, delta_disparos], ["POZO", "POZO ID", "ZONA"])
     
-    # Filtrar los valores máximos de los disparos por pozo
-    df_acumulada_normalizada = df_corte.groupby(["POZO", "POZO ID", "ZONA","WGS84_UTMX_OBJETIVO", "WGS84_UTMY_OBJETIVO"])[['MESES ACTIVO','NP Mbbl','WP Mbbl','GP MMcf']].max().reset_index()
-    # Totalizar los la producion acumulada por pozo
-    df_acumulada_corte = df_acumulada_normalizada.groupby(["POZO", "ZONA","WGS84_UTMX_OBJETIVO", "WGS84_UTMY_OBJETIVO",'MESES ACTIVO'])[['NP Mbbl','WP Mbbl','GP MMcf']].sum().reset_index()
-       
+    # Número global de cada disparo del incremento; los nuevos se agregan al final
+    globales = np.array(delta_disparos[SHOT_KEYS]
+                        .merge(df_disparos[SHOT_KEYS].reset_index(names='GLOBAL'), on=SHOT_KEYS, how='left')['GLOBAL'],
+                        dtype="float64")
+    nuevos = np.isnan(globales)
+    n_previos = len(df_disparos)
+    globales[nuevos] = n_previos + np.arange(nuevos.sum())
+    globales = globales.astype("int64")
     
+    # Actualizar solo los disparos afectados
+    afectados = globales[~nuevos]
+    for col in ['MESES ACTIVO'] + CUM_COLUMNS:
+        df_disparos.loc[afectados, col] = np.fmax(df_disparos[col].to_numpy()[afectados],
+                                                  delta_disparos.loc[~nuevos, col].to_numpy())
+    df_disparos = pd.concat([df_disparos, delta_disparos[nuevos]], ignore_index=True)
+    shot_codes = globales[delta_codes]
     
-    #Identifica la fecha de corte OFM (maxima) y crea un filtro de los pozos que tienen produccion a esa fecha
-    fecha_corte_OFM = df_loaded['FECHA'].max()
-    df_fecha_corte_OFM = df_loaded[df_loaded['FECHA'] == fecha_corte_OFM]
-        
-    #Crear dataframe de la producción diaria por disparo a la fecha maxima del OFM
-    df_prod_diaria_xdisparo = df_fecha_corte_OFM.groupby(["POZO", "POZO ID", "ZONA","WGS84_UTMX_OBJETIVO", "WGS84_UTMY_OBJETIVO",'FECHA'])[['ACEITE DIARIO BPD', 'AGUA DIARIA BPD', 
-                                                            'GAS DIARIO MMcfd']].max().reset_index()
-    # Totalizar los la producion diaria por pozo
-    df_diaria_totalizada = df_prod_diaria_xdisparo.groupby(["POZO", "ZONA","WGS84_UTMX_OBJETIVO", "WGS84_UTMY_OBJETIVO",'FECHA'])[['ACEITE DIARIO BPD', 'AGUA DIARIA BPD', 
-                                                            'GAS DIARIO MMcfd']].sum().reset_index()
-        
-    #df_integral = pd.merge(df_acumulada_totalizada, df_diaria_totalizada, on=["POZO", "ZONA"], how="inner")
+    # Integrar las celdas de acumuladas del incremento (disparos nuevos y meses nuevos)
+    codes, meses, valid = _cumulative_cells(df_delta, shot_codes)
+    delta_valores = np.stack([df_delta[col].to_numpy(dtype="float64")[valid] for col in CUM_COLUMNS])
+    acumulada_offsets, acumulada_meses, acumulada_valores = merge_cumulative_cells(
+        data.acumulada_offsets, data.acumulada_meses, data.acumulada_valores, codes, meses, delta_valores,
+        len(df_disparos))
+    acumulada_cortes = np.union1d(data.acumulada_cortes, meses).astype(data.acumulada_cortes.dtype)
     
-    #df_lista_coor = df_loaded[["POZO", "WGS84_UTMX_OBJETIVO", "WGS84_UTMY_OBJETIVO", "ZONA"]].drop_duplicates()
+    # Fotos diarias de las fechas nuevas; si todas son posteriores basta con agregarlas al final
+    coordinate_table = get_coordinate_table()
+    delta_diaria = add_ratios(_daily_rows(df_delta, df_disparos, shot_codes))
+    add_latlon([delta_diaria], coordinate_table)
+    df_diaria_fechas = data.df_diaria_fechas.copy()
+    _unify_categories([df_diaria_fechas, delta_diaria], ["POZO", "ZONA"])
+    df_diaria_fechas = pd.concat([df_diaria_fechas, delta_diaria], ignore_index=True)
+    if len(data.diaria_fechas) and len(fechas_delta) and fechas_delta[0] < data.diaria_fechas[-1]:
+        df_diaria_fechas = df_diaria_fechas.sort_values('FECHA', kind="stable", ignore_index=True)
+        diaria_fechas, diaria_offsets = np.unique(df_diaria_fechas['FECHA'].to_numpy(), return_index=True)
+        diaria_offsets = np.append(diaria_offsets, len(df_diaria_fechas))
+    else:
+        nuevas_fechas, nuevos_offsets = np.unique(delta_diaria['FECHA'].to_numpy(), return_index=True)
+        diaria_fechas = np.concatenate([data.diaria_fechas, nuevas_fechas.astype(data.diaria_fechas.dtype)])
+        diaria_offsets = np.concatenate([data.diaria_offsets[:-1], nuevos_offsets + len(data.df_diaria_fechas),
+                                         [len(df_diaria_fechas)]])
     
-    df_data = df_acumulada_totalizada
-    df_data_corte = df_acumulada_corte
-    df_diaria_actual = df_diaria_totalizada
-    df_pozos = df_loaded[["POZO", "WGS84_UTMX_OBJETIVO", "WGS84_UTMY_OBJETIVO", "ZONA"]].drop_duplicates()
-    merged_data = merged_df
+    # Índice por pozo: las filas del incremento se insertan en la historia ya ordenada
+    df_historia, historia_offsets = merge_well_index(data.df_historia, df_delta[HISTORY_COLUMNS].copy())
     
-    # Definir el transformador para convertir de UTM a Lat/Long
-    transformer = Transformer.from_crs(
-        "epsg:32614",  # UTM Zone 14N WGS84 (ajustar según tu zona UTM)
-        "epsg:4326",   # WGS84
-        always_xy=True
-    )
-       
-    # Función para convertir UTM a Lat/Long
-    def utm_to_latlon(utm_easting, utm_northing):
-        lon, lat = transformer.transform(utm_easting, utm_northing)
-        return lat, lon
-    
-    # Aplicar la conversión de UTM a Lat/Long para los pozos
-    df_pozos[['Latitude', 'Longitude']] = df_pozos.apply(
-        lambda row: utm_to_latlon(row['WGS84_UTMX_OBJETIVO'], row['WGS84_UTMY_OBJETIVO']), 
-        axis=1, result_type='expand'
-    )
-        
-    # Aplicar la conversión de UTM a Lat/Long para los pozos
-    df_data[['Latitude', 'Longitude']] = df_data.apply(
-        lambda row: utm_to_latlon(row['WGS84_UTMX_OBJETIVO'], row['WGS84_UTMY_OBJETIVO']), 
-        axis=1, result_type='expand'
-    )
+    # Las tablas por pozo se derivan de la tabla compacta por disparo (independiente del historial)
+    n_filas = data.n_filas + len(df_delta)
+    df_data = rollup_acumulada(df_disparos)
+    df_data_corte = rollup_corte(df_disparos, acumulada_offsets, acumulada_meses, acumulada_valores)
+    df_pozos = rollup_pozos(df_disparos, pd.RangeIndex(n_filas))
+    merged_data = rollup_resumen(df_disparos)
+    add_latlon([df_pozos, df_data, df_data_corte], coordinate_table)
     
-    # Aplicar la conversión de UTM a Lat/Long para los pozos
-    df_data_corte[['Latitude', 'Longitude']] = df_data_corte.apply(
-        lambda row: utm_to_latlon(row['WGS84_UTMX_OBJETIVO'], row['WGS84_UTMY_OBJETIVO']), 
-        axis=1, result_type='expand'
-    )
+    return ProcessedData(df_pozos=df_pozos, df_data=df_data, df_data_corte=df_data_corte, merged_data=merged_data,
+                         df_disparos=df_disparos, acumulada_offsets=acumulada_offsets,
+                         acumulada_meses=acumulada_meses, acumulada_valores=acumulada_valores,
+                         acumulada_cortes=acumulada_cortes,
+                         df_diaria_fechas=df_diaria_fechas, diaria_fechas=diaria_fechas,
+                         diaria_offsets=diaria_offsets, df_historia=df_historia, historia_offsets=historia_offsets,
+                         polygon_lats=data.polygon_lats, polygon_lons=data.polygon_lons, zoom=data.zoom,
+                         n_filas=n_filas)
+
+# GRÁFICOS PRECALCULADOS EN EL SERVIDOR
+# Los histogramas se envían como 40 barras ya contadas y los mapas de densidad como una malla
+# de celdas agregadas, de modo que el tamaño de cada figura no crece con el número de pozos.
+HISTOGRAM_BINS = 40
+DENSITY_GRID_CELLS = 64
+
+# Configuración de color y estilo de los histogramas
+HISTOGRAM_STYLE = dict(
+    plot_bgcolor="white",
+    font=dict(family='Arial', size=12, color='black'),
+    xaxis_title_font=dict(size=12, color='black', family='Arial'),
+    yaxis_title_font=dict(size=12, color='black', family='Arial'),
+    height=200,
+    width=190,
+    margin=dict(l=20, r=170, t=40, b=20)  # Ajustar márgenes para mejor visualización
+)
+
+def plot_histogram(df, variable, title, color, prebinned=True):
+    if prebinned:
+        # Conteo por intervalos con NumPy: la figura lleva 40 barras en lugar de un valor por pozo
+        values = df[variable].to_numpy(dtype="float64")
+        values = values[np.isfinite(values)]
+        counts, edges = np.histogram(values, bins=HISTOGRAM_BINS) if len(values) else (np.array([]), np.array([0.0]))
+        fig = go.Figure(go.Bar(x=(edges[:-1] + edges[1:]) / 2, y=counts, width=np.diff(edges),
+                               hovertemplate=f"{variable}=%{{x}}<br>count=%{{y}}<extra></extra>"))
+        fig.update_layout(bargap=0, xaxis_title=variable)
+    else:
+        fig = px.histogram(df, x=variable, nbins=HISTOGRAM_BINS, title=title)
     
-    # Aplicar la conversión de UTM a Lat/Long para los pozos
-    df_diaria_actual[['Latitude', 'Longitude']] = df_diaria_actual.apply(
-        lambda row: utm_to_latlon(row['WGS84_UTMX_OBJETIVO'], row['WGS84_UTMY_OBJETIVO']), 
-        axis=1, result_type='expand'
+    # Configuración del histograma con título centrado y color específico
+    fig.update_layout(
+        **HISTOGRAM_STYLE,
+        title=dict(text=title, x=0.2, font=dict(size=16, color='black', family='Arial')),
+        yaxis_title="Total del Pozos"
     )
+    fig.update_traces(marker_color=color, marker_line_color='black', marker_line_width=0.5)
+    return fig
+
+def density_grid(df, variable, cells=DENSITY_GRID_CELLS):
+    # Agrega los pozos en una malla fija de cells x cells: cada celda ocupada se representa por el
+    # centroide de sus pozos con la suma de la variable. Como la celda es mucho menor que el radio
+    # del mapa de calor, el resultado visual es el mismo que enviando cada punto.
+    lat = df['Latitude'].to_numpy(dtype="float64")
+    lon = df['Longitude'].to_numpy(dtype="float64")
+    z = df[variable].to_numpy(dtype="float64")
+    valid = np.isfinite(lat) & np.isfinite(lon) & np.isfinite(z)
+    lat, lon, z = lat[valid], lon[valid], z[valid]
+    if len(z) == 0:
+        return pd.DataFrame({'Latitude': [], 'Longitude': [], variable: []})
     
-    # Definir y convertir las coordenadas UTM para el polígono
-    polygon_utm_coords = [
-        (629254, 2294990),
-        (629205, 2305136),
-        (643050, 2305249),
-        (643137, 2295102),
-        (629254, 2294990)
-        
-    ]
-    polygon_latlon = [utm_to_latlon(easting, northing) for easting, northing in polygon_utm_coords]
+    bins = [np.linspace(lat.min(), lat.max() + 1e-9, cells + 1), np.linspace(lon.min(), lon.max() + 1e-9, cells + 1)]
+    counts, _, _ = np.histogram2d(lat, lon, bins=bins)
+    sum_lat, _, _ = np.histogram2d(lat, lon, bins=bins, weights=lat)
+    sum_lon, _, _ = np.histogram2d(lat, lon, bins=bins, weights=lon)
+    sum_z, _, _ = np.histogram2d(lat, lon, bins=bins, weights=z)
+    occupied = counts > 0
+    return pd.DataFrame({'Latitude': sum_lat[occupied] / counts[occupied],
+                         'Longitude': sum_lon[occupied] / counts[occupied],
+                         variable: sum_z[occupied]})
+
+# CAPAS FIJAS DE LOS MAPAS
+def build_static_layers(df_pozos, polygon_lats, polygon_lons):
+    # Las capas de todos los pozos y del polígono ACM son iguales en los nueve mapas: se construyen
+    # una sola vez por conjunto de datos. Las coordenadas van en float32 para que plotly las
+    # serialice como arreglos binarios compactos en lugar de listas de números en texto. Se guardan
+    # como diccionarios: los objetos de plotly no se pueden compartir entre hilos al agregarlos a figuras.
     
-    # Separar las coordenadas en latitudes y longitudes
-    polygon_lats, polygon_lons = zip(*polygon_latlon)
-    zoom = 1    
-  
-    return df_pozos, df_data,df_data_corte,df_diaria_actual, merged_data, polygon_lats, polygon_lons, zoom
+    # Agregar los marcadores de todos los pozos
+    well_coort = go.Scattermapbox(
+        lat=df_pozos['Latitude'].to_numpy(dtype="float32"),
+        lon=df_pozos['Longitude'].to_numpy(dtype="float32"),
+        mode='markers',
+        marker=go.scattermapbox.Marker(
+            size=10,
+            color='black',
+            opacity=1
+        ),
+        text=df_pozos['POZO'].astype(str).to_numpy(),  # Texto emergente
+        hoverinfo='text',
+        name='Pozos'  # Nombre de la leyenda
+    )
+    
+    # Agregar el polígono
+    polygon_trace = go.Scattermapbox(
+        fill="none",
+        lat=polygon_lats,
+        lon=polygon_lons,
+        mode="lines",
+        line=dict(width=2, color="black"),
+        hoverinfo='none',
+        opacity=1,
+        name='ACM'  # Nombre de la leyenda
+    )
+    return well_coort.to_plotly_json(), polygon_trace.to_plotly_json()
 
-def plot_density_map(df,df_p, variable, polygon_lats, polygon_lons,color_continuous_scale,zoom):
+@st.cache_resource(max_entries=16)
+def get_static_layers(dataset_key, _df_pozos, polygon_lats, polygon_lons):
+    # Capas fijas compartidas por todos los mapas (y todas las sesiones) del mismo archivo
+    return build_static_layers(_df_pozos, polygon_lats, polygon_lons)
+
+def plot_density_map(df, static_layers, variable, color_continuous_scale, zoom, prebinned=False):
     # Ajusta el factor de escala según el nivel de detalle que necesites
     radius = max(2, 35 - zoom * 1)  # Ejemplo de fórmula que disminuye el radio a medida que el zoom aumenta
     
@@ -147,8 +1430,12 @@ def plot_density_map(df,df_p, variable, polygon_lats, polygon_lons,color_continu
     max_val = df[variable].max()
     range_color = [min_val, max_val]
     
+    # Con prebinned se envía la malla agregada en lugar de cada pozo
+    df_density = density_grid(df, variable) if prebinned else df
+    df_density = df_density[['Latitude', 'Longitude', variable]].astype("float32")
+    
     # Crear el mapa de densidad
-    fig = px.density_mapbox(df, lat='Latitude', lon='Longitude', z=variable, radius=radius,
+    fig = px.density_mapbox(df_density, lat='Latitude', lon='Longitude', z=variable, radius=radius,
                             center=dict(lat=df['Latitude'].mean(), lon=df['Longitude'].mean()), 
                             zoom=zoom,  # Ajustar el nivel de zoom según sea necesario
                             mapbox_style="carto-positron",
@@ -157,52 +1444,25 @@ def plot_density_map(df,df_p, variable, polygon_lats, polygon_lons,color_continu
                             range_color=range_color,
                             title=f"Mapa de Densidad de {variable}")
 
-    # Agregar los marcadores de todos los pozos
-    well_coort = go.Scattermapbox(
-        lat=df_p['Latitude'],
-        lon=df_p['Longitude'],
-        mode='markers',
-        marker=go.scattermapbox.Marker(
-            size=10,
-            color='black',
-            opacity=1
-        ),
-        text=df_p['POZO'],  # Texto emergente
-        hoverinfo='text',
-        name='Pozos'  # Nombre de la leyenda
-    )    
-
     # Agregar los marcadores de los pozos filtrados
     well_coorf = go.Scattermapbox(
-        lat=df['Latitude'],
-        lon=df['Longitude'],
+        lat=df['Latitude'].to_numpy(dtype="float32"),
+        lon=df['Longitude'].to_numpy(dtype="float32"),
         mode='markers',
         marker=go.scattermapbox.Marker(
             size=9,
             color='red',
             opacity=1
         ),
-        text=df['POZO'],  # Texto emergente
+        text=df['POZO'].astype(str).to_numpy(),  # Texto emergente
         hoverinfo='text',
         name='Seleccionados' # Nombre de la leyenda
     )
     
-    # Agregar el polígono
-    polygon_trace = go.Scattermapbox(
-        fill="none",
-        lat=polygon_lats,
-        lon=polygon_lons,
-        mode="lines",
-        line=dict(width=2, color="black"),
-        hoverinfo='none',
-        opacity=1,
-        name='ACM'  # Nombre de la leyenda
-    )
-    
-    # Combinar el mapa de densidad con los marcadores y el polígono
-    fig.add_trace(well_coort)
-    fig.add_trace(well_coorf)
-    fig.add_trace(polygon_trace)
+    # Combinar el mapa de densidad con los marcadores de todos los pozos, los seleccionados y el polígono
+    # (plotly modifica el diccionario que recibe; cada figura usa su propia copia de las capas fijas)
+    well_coort, polygon_trace = (dict(layer) for layer in static_layers)
+    fig.add_traces([well_coort, well_coorf, polygon_trace])
     
     # Actualizar el diseño del gráfico
     fig.update_layout(
@@ -219,265 +1479,512 @@ def plot_density_map(df,df_p, variable, polygon_lats, polygon_lons,color_continu
     
     return fig
 
+# DEFINICIÓN DE LAS PESTAÑAS
+# Cada pestaña muestra tres columnas (mapa, histograma y tabla) de un mismo dataframe
+TAB_SPECS = {
+    "ACUMULADA TOTAL": [
+        dict(variable="NP Mbbl", header="ACEITE ACUMULADO TOTAL (Mbbl)", title="Histograma de Aceite Acumulado",
+             color='green', table=["POZO", "ZONA", 'MESES ACTIVO', 'NP Mbbl'], key="Np"),
+        dict(variable="WP Mbbl", header="AGUA ACUMULADA TOTAL (Mbbl)", title="Histograma de Agua Acumulada",
+             color='blue', table=["POZO", "ZONA", 'MESES ACTIVO', 'WP Mbbl'], key="Wp"),
+        dict(variable="GP MMcf", header="GAS ACUMULADO TOTAL (MMcf)", title="Histograma de Gas Acumulado",
+             color='orange', table=["POZO", "ZONA", 'MESES ACTIVO', 'GP MMcf'], key="Gp"),
+    ],
+    "ACUMULADA NORMALIZADA": [
+        dict(variable="NP Mbbl", header="ACEITE ACUMULADO NORMALIZADO A {meses} MESES (Mbbl)",
+             title="Histograma de Aceite Acumulado Normalizado",
+             color='green', table=["POZO", "ZONA", 'MESES ACTIVO', 'NP Mbbl'], key="Np_corte"),
+        dict(variable="WP Mbbl", header="AGUA ACUMULADA NORMALIZADA A {meses} MESES (Mbbl)",
+             title="Histograma de Agua Acumulada Normalizada",
+             color='blue', table=["POZO", "ZONA", 'MESES ACTIVO', 'WP Mbbl'], key="Wp_corte"),
+        dict(variable="GP MMcf", header="GAS ACUMULADO NORMALIZADO A {meses} MESES  (MMcf)",
+             title="Histograma de Gas Acumulado Normalizado",
+             color='orange', table=["POZO", "ZONA", 'MESES ACTIVO', 'GP MMcf'], key="Gp_corte"),
+    ],
+    "PRODUCCIÓN ACTUAL": [
+        dict(variable="ACEITE DIARIO BPD", header="ACEITE DIARIO (BPD)", title="Histograma de Aceite Diario",
+             color='green', table=["POZO", "ZONA", 'FECHA', 'ACEITE DIARIO BPD'], key="Qo"),
+        dict(variable="AGUA DIARIA BPD", header="AGUA DIARIA (BPD)", title="Histograma de Agua Diaria",
+             color='blue', table=["POZO", "ZONA", 'FECHA', 'AGUA DIARIA BPD'], key="Qw"),
+        dict(variable="GAS DIARIO MMcfd", header="GAS DIARIO  (MMcfd)", title="Histograma de Gas Diario",
+             color='orange', table=["POZO", "ZONA", "FECHA", "GAS DIARIO MMcfd", "RGA Mcfb"], key="Qg"),
+    ],
+    "RELACIONES": [
+        dict(variable="RGA Mcfb", header="RELACIÓN GAS-ACEITE (Mcf/bbl)", title="Histograma de RGA",
+             color='orange', table=["POZO", "ZONA", "FECHA", "GAS DIARIO MMcfd", "ACEITE DIARIO BPD", "RGA Mcfb"],
+             key="RGA"),
+        dict(variable="CORTE DE AGUA %", header="CORTE DE AGUA (%)", title="Histograma de Corte de Agua",
+             color='blue', table=["POZO", "ZONA", "FECHA", "AGUA DIARIA BPD", "ACEITE DIARIO BPD", "CORTE DE AGUA %"],
+             key="Fw"),
+        dict(variable="RAA bbl/bbl", header="RELACIÓN AGUA-ACEITE (bbl/bbl)", title="Histograma de RAA",
+             color='teal', table=["POZO", "ZONA", "FECHA", "AGUA DIARIA BPD", "ACEITE DIARIO BPD", "RAA bbl/bbl"],
+             key="RAA"),
+    ],
+}
+# Pestañas que muestran la foto diaria de una fecha
+DAILY_TABS = ("PRODUCCIÓN ACTUAL", "RELACIONES")
+
+# MEMORIA DE FIGURAS
+# Las figuras se memorizan por (archivo, pestaña, variable, zonas seleccionadas, ...) en un LRU
+# acotado, de modo que volver a una selección de zonas anterior no reconstruye nada.
+FIGURE_CACHE_SIZE = int(os.environ.get("ACM_FIGURE_CACHE_SIZE", "256"))
+# Hilos del pool de construcción de figuras (compartido por todas las sesiones)
+FIGURE_WORKERS = int(os.environ.get("ACM_FIGURE_WORKERS", str(min(3, os.cpu_count() or 1))))
+
+class FigureCache:
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get_or_build(self, key, build):
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                return self.entries[key]
+        fig = build()
+        with self.lock:
+            self.entries[key] = fig
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return fig
+
+@st.cache_resource
+def get_figure_cache():
+    return FigureCache(FIGURE_CACHE_SIZE)
+
+@st.cache_resource
+def get_figure_executor():
+    return ThreadPoolExecutor(max_workers=FIGURE_WORKERS, thread_name_prefix="acm-figuras")
+
+def tab_frames(data, tab_name, meses_corte=MESES_CORTE, fecha=None):
+    # Dataframe de mapas/histogramas y dataframe de tablas de cada pestaña
+    if tab_name == "ACUMULADA TOTAL":
+        return data.df_data, data.merged_data
+    if tab_name == "ACUMULADA NORMALIZADA":
+        df_corte = cutoff_data(data, meses_corte)
+        return df_corte, df_corte
+    # Foto de la producción diaria a la fecha indicada (por omisión, la fecha de corte OFM)
+    df_diaria = daily_snapshot(data, fecha) if fecha is not None else data.df_diaria_actual
+    return df_diaria, df_diaria
+
+def build_column_figures(spec, df_tab, static_layers, zoom, prebinned):
+    # Mapa de densidad e histograma de una columna de pestaña
+    with diagnostic_stage(f"plot_density_map {spec['key']}"):
+        fig_map = plot_density_map(df_tab, static_layers, spec["variable"], 'turbo', zoom, prebinned)
+    with diagnostic_stage(f"plot_histogram {spec['key']}"):
+        fig_histogram = plot_histogram(df_tab, spec["variable"], spec["title"], spec["color"], prebinned)
+    return fig_map, fig_histogram
+
+def column_header(col, text):
+    col.markdown(f"""<h3 style='text-align:center; font-family:Arial;
+                  font-size:18px; color:#333333;'>{text}</h3>""",
+        unsafe_allow_html=True
+    )
+
+def render_tab(tab_name, df_tab, df_table, figure_key, static_layers, zoom, prebinned, meses_corte=MESES_CORTE):
+    # Dibuja las tres columnas de una pestaña; figure_key identifica el archivo y la selección
+    figure_cache = get_figure_cache()
+    specs = TAB_SPECS[tab_name]
+    
+    # Las figuras de las tres columnas se construyen en paralelo en el pool; cada columna se muestra
+    # en cuanto sus figuras están listas, en el orden de la página
+    futures = [get_figure_executor().submit(
+                   bind_diagnostics(figure_cache.get_or_build), (*figure_key, tab_name, spec["variable"], prebinned),
+                   lambda spec=spec: build_column_figures(spec, df_tab, static_layers, zoom, prebinned))
+               for spec in specs]
+    
+    # Mostrar en tres columnas
+    for col, spec, future in zip(st.columns(3), specs, futures):
+        with col:
+            # Mostrar el mapa (ya sea filtrado o no)
+            column_header(col, spec["header"].format(meses=meses_corte))
+            fig_map, fig_histogram = future.result()
+            record_figure_payload(f"json {spec['key']}", fig_map, fig_histogram)
+            # Al seleccionar un pozo en el mapa se muestra su historia debajo de las columnas; una caja
+            # o un lazo selecciona los pozos de todas las pestañas
+            map_key = f"fig{spec['key']}_key"
+            st.plotly_chart(fig_map, use_container_width=True, key=map_key, selection_mode=("points", "box", "lasso"),
+                            on_select=lambda map_key=map_key: select_on_map(map_key))
+            st.plotly_chart(fig_histogram, use_container_width=True, key=f"fig_histogram_{spec['key']}_key")
+            st.write(df_table[spec["table"]])
+
+# SELECCIÓN ESPACIAL DE POZOS
+# Filtro por polígono (ACM o archivo cargado) y selección de caja o lazo en los mapas. Ambos se
+# combinan con el filtro de zonas y se aplican a los mapas, histogramas y tablas de todas las pestañas.
+SPATIAL_FILTERS = ["TODOS LOS POZOS", "DENTRO DEL ACM", "FUERA DEL ACM",
+                   "DENTRO DE LOS POLÍGONOS", "FUERA DE LOS POLÍGONOS"]
+
+def select_on_map(chart_key):
+    # Un clic sobre un pozo abre su historia; una caja o lazo con varios pozos los selecciona
+    selection = st.session_state[chart_key]["selection"]
+    positions = list(dict.fromkeys((point["lat"], point["lon"]) for point in selection["points"]
+                                   if "lat" in point and "lon" in point))
+    if selection.get("box") or selection.get("lasso") or len(positions) > 1:
+        st.session_state["seleccion_mapa"] = positions
+    elif positions:
+        st.session_state["punto_pozo"] = positions[-1]
+    else:
+        st.session_state.pop("seleccion_mapa", None)
+
+def wells_at(df_wells, positions):
+    # POZO de las posiciones seleccionadas en un mapa; los marcadores se envían en float32, así que
+    # se comparan con las coordenadas de los pozos en esa misma precisión
+    df_positions = pd.DataFrame(np.asarray(positions, dtype="float32").reshape(-1, 2),
+                                columns=["Latitude", "Longitude"])
+    df_coords = pd.DataFrame({"Latitude": df_wells["Latitude"].to_numpy(dtype="float32"),
+                              "Longitude": df_wells["Longitude"].to_numpy(dtype="float32"),
+                              "POZO": df_wells["POZO"].to_numpy()})
+    return df_coords.merge(df_positions.drop_duplicates(), on=["Latitude", "Longitude"])["POZO"].unique()
+
+def spatial_selection(dataset_key, df_wells):
+    # POZO que pasan el filtro espacial y la selección del mapa, o None si no hay ninguno activo
+    pozos = None
+    filtro = st.sidebar.selectbox("FILTRO ESPACIAL", SPATIAL_FILTERS)
+    if filtro != "TODOS LOS POZOS":
+        polygons = None
+        if filtro.endswith("ACM"):
+            polygons = acm_polygons()
+        else:
+            archivo = st.sidebar.file_uploader("POLÍGONOS (GeoJSON lon/lat o CSV UTM)", type=["geojson", "json", "csv"])
+            if archivo:
+                polygons = read_polygons(archivo.getvalue(), archivo.name)
+            else:
+                st.sidebar.warning("CARGA UN ARCHIVO DE POLÍGONOS ❗❗")
+        if polygons is not None:
+            with diagnostic_stage("spatial_filter", poligonos=len(polygons)):
+                inside = get_well_grid(dataset_key, df_wells).inside(polygons)
+            pozos = df_wells["POZO"].to_numpy()[inside if filtro.startswith("DENTRO") else ~inside]
+
+    positions = st.session_state.get("seleccion_mapa")
+    if positions is not None:
+        pozos_mapa = wells_at(df_wells, positions)
+        st.sidebar.caption(f"{len(pozos_mapa)} POZOS SELECCIONADOS EN EL MAPA")
+        st.sidebar.button("LIMPIAR SELECCIÓN DEL MAPA", on_click=st.session_state.pop, args=("seleccion_mapa", None))
+        # Index.intersection admite POZO vacíos (NaN) junto a nombres, a diferencia de np.intersect1d
+        pozos = pozos_mapa if pozos is None else pd.Index(pozos).intersection(pozos_mapa).to_numpy()
+    return None if pozos is None else pd.unique(pozos)
+
+def selection_key(pozos):
+    # Llave compacta de una selección de pozos para la memoria de figuras
+    if pozos is None:
+        return None
+    return hashlib.sha256("\n".join(sorted(map(str, pozos))).encode()).hexdigest()
+
+def select_wells(df, zonas, pozos=None):
+    # Filas de las zonas seleccionadas y, si hay selección espacial, solo de sus pozos
+    mask = df["ZONA"].isin(zonas)
+    if pozos is not None:
+        mask &= df["POZO"].isin(pozos)
+    return df[mask]
+
+# HISTORIA DE UN POZO
+
+def nearest_well(df_wells, lat, lon):
+    # Pozo más cercano a una posición del mapa
+    if df_wells.empty:
+        return None
+    distance = (df_wells['Latitude'].to_numpy() - lat) ** 2 + (df_wells['Longitude'].to_numpy() - lon) ** 2
+    return df_wells['POZO'].iloc[int(np.argmin(distance))]
+
+def plot_well_history(df_pozo, columns, title):
+    # Una gráfica por variable, con una línea por disparo (POZO ID)
+    df_long = df_pozo.melt(id_vars=["POZO ID", "FECHA"], value_vars=columns, var_name="VARIABLE", value_name="VALOR")
+    fig = px.line(df_long, x="FECHA", y="VALOR", color="POZO ID", facet_row="VARIABLE",
+                  height=200 * len(columns) + 100, title=title)
+    fig.update_yaxes(matches=None, title_text="")
+    fig.for_each_annotation(lambda annotation: annotation.update(text=annotation.text.split("=")[-1]))
+    fig.update_layout(title_font=dict(family="Arial", size=18, color="#333333"))
+    return fig
+
+def render_well_history(data, df_wells, tab_name):
+    # Historia mensual del pozo seleccionado en los mapas, servida desde el índice por pozo
+    punto = st.session_state.get("punto_pozo")
+    pozo = nearest_well(df_wells, *punto) if punto else None
+    df_pozo = well_history(data, pozo) if pozo is not None else None
+    if df_pozo is None or df_pozo.empty:
+        return
+    st.markdown(f"""<h3 style='text-align:center; font-family:Arial;
+                font-size:18px; color:#333333;'>HISTORIA DEL POZO {pozo}</h3>""", unsafe_allow_html=True)
+    if st.button("CERRAR HISTORIA", key=f"cerrar_historia_{tab_name}"):
+        del st.session_state["punto_pozo"]
+        st.rerun()
+    col_acumulada, col_gastos, col_relaciones = st.columns(3)
+    col_acumulada.plotly_chart(plot_well_history(df_pozo, CUM_COLUMNS, "Acumuladas mensuales"),
+                               use_container_width=True, key=f"historia_acumulada_{tab_name}")
+    col_gastos.plotly_chart(plot_well_history(df_pozo, RATE_COLUMNS, "Gastos diarios"),
+                            use_container_width=True, key=f"historia_gastos_{tab_name}")
+    col_relaciones.plotly_chart(plot_well_history(add_ratios(df_pozo.copy()), RATIO_COLUMNS, "Relaciones"),
+                                use_container_width=True, key=f"historia_relaciones_{tab_name}")
+
+# REPORTES PUBLICADOS
+def snapshot_name(tab_name, zona=None):
+    # Archivo de las tres columnas de una pestaña para una zona (None: todas las zonas)
+    digest = hashlib.sha256(f"{tab_name}|{zona or ''}".encode()).hexdigest()[:16]
+    return f"{digest}.json.gz"
+
+def write_snapshot(path, tab_name, df_tab, df_table, static_layers, zoom, meses_corte):
+    # Figuras y tablas de una pestaña como JSON comprimido, en el formato que lee load_snapshot
+    columns = []
+    for spec in TAB_SPECS[tab_name]:
+        fig_map, fig_histogram = build_column_figures(spec, df_tab, static_layers, zoom, prebinned=True)
+        columns.append(dict(key=spec["key"], header=spec["header"].format(meses=meses_corte),
+                            mapa=pio.to_json(fig_map), histograma=pio.to_json(fig_histogram),
+                            tabla=df_table[spec["table"]].to_json(orient="split", date_format="iso", index=False)))
+    with gzip.open(path, "wt", encoding="utf-8") as f:
+        json.dump(columns, f)
+
+def publish_dataset(data, key, label, meses_corte=MESES_CORTE, origen=None):
+    # Publica todas las pestañas de un archivo para todas las zonas y para cada zona; el reporte
+    # aparece completo o no aparece (se escribe aparte y se renombra al final). origen es la ruta del
+    # archivo vigilado: una versión nueva del mismo archivo reemplaza a los reportes anteriores
+    zonas = sorted(str(zona) for zona in data.df_pozos["ZONA"].dropna().unique())
+    static_layers = build_static_layers(data.df_pozos, data.polygon_lats, data.polygon_lons)
+    os.makedirs(PUBLISH_DIR, exist_ok=True)
+    path = os.path.join(PUBLISH_DIR, key)
+    tmp_path = os.path.join(PUBLISH_DIR, f".tmp-{key}-{uuid.uuid4().hex}")
+    old_path = os.path.join(PUBLISH_DIR, f".old-{key}-{uuid.uuid4().hex}")
+    os.makedirs(tmp_path)
+    try:
+        for tab_name in TAB_SPECS:
+            df_tab, df_table = tab_frames(data, tab_name, meses_corte)
+            for zona in [None] + zonas:
+                seleccion = zonas if zona is None else [zona]
+                write_snapshot(os.path.join(tmp_path, snapshot_name(tab_name, zona)), tab_name,
+                               select_wells(df_tab, seleccion), select_wells(df_table, seleccion),
+                               static_layers, data.zoom, meses_corte)
+        manifest = dict(etiqueta=label, publicado=time.time(), zonas=zonas, pestañas=list(TAB_SPECS),
+                        meses_corte=meses_corte, origen=origen)
+        with open(os.path.join(tmp_path, "manifest.json"), "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False)
+        # Una nueva publicación del mismo archivo reemplaza a la anterior
+        if os.path.isdir(path):
+            os.replace(path, old_path)
+        os.replace(tmp_path, path)
+    finally:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        shutil.rmtree(old_path, ignore_errors=True)
+    if origen is not None:
+        for other_key, other in list_published().items():
+            if other_key != key and other.get("origen") == origen:
+                shutil.rmtree(os.path.join(PUBLISH_DIR, other_key), ignore_errors=True)
+    prune_published(PUBLISH_KEEP)
+    return path
+
+def list_published():
+    # Reportes publicados, del más reciente al más antiguo: {llave: manifiesto}
+    published = []
+    if os.path.isdir(PUBLISH_DIR):
+        for name in os.listdir(PUBLISH_DIR):
+            manifest_path = os.path.join(PUBLISH_DIR, name, "manifest.json")
+            if name.startswith(".") or not os.path.exists(manifest_path):
+                continue
+            try:
+                with open(manifest_path, encoding="utf-8") as f:
+                    manifest = json.load(f)
+            except (OSError, ValueError):
+                continue
+            published.append((manifest.get("publicado", 0), name, manifest))
+    return {name: manifest for _, name, manifest in sorted(published, key=lambda item: item[0], reverse=True)}
+
+def prune_published(keep):
+    # Conservar solo los reportes publicados más recientes
+    for key in list(list_published())[keep:]:
+        shutil.rmtree(os.path.join(PUBLISH_DIR, key), ignore_errors=True)
+
+@st.cache_resource(max_entries=64, show_spinner=False)
+def load_snapshot(path, mtime):
+    # Columnas de una pestaña publicada: (llave, encabezado, mapa, histograma, tabla); se decodifican una sola
+    # vez por archivo y se comparten entre todas las sesiones
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        columns = json.load(f)
+    return [(column["key"], column["header"], pio.from_json(column["mapa"]), pio.from_json(column["histograma"]),
+             pd.read_json(io.StringIO(column["tabla"]), orient="split")) for column in columns]
+
+class Publisher:
+    # Hilo de fondo que publica las exportaciones nuevas o modificadas del directorio vigilado
+    def __init__(self, watch_dir, interval=PUBLISH_POLL_SECONDS):
+        self.watch_dir = watch_dir
+        self.interval = interval
+        self.published = {}  # (ruta, tamaño, fecha de modificación) -> llave publicada (None si falló)
+        self.thread = threading.Thread(target=self._run, name="acm-publicador", daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                self.publish_pending()
+            except Exception:  # Directorio vigilado no disponible; se reintenta en la siguiente vuelta
+                publish_logger.exception("Error al revisar el directorio vigilado")
+            time.sleep(self.interval)
+
+    def publish_pending(self):
+        # Solo se consideran las PUBLISH_KEEP exportaciones más recientes (las demás se descartarían al
+        # podar); se publican de la más antigua a la más reciente para que esta quede primero
+        keys = []
+        for path in reversed(list_watched_files(self.watch_dir)[:PUBLISH_KEEP]):
+            stat = os.stat(path)
+            signature = (path, stat.st_size, stat.st_mtime)
+            if signature not in self.published:
+                try:
+                    self.published[signature] = self.publish_file(path)
+                except Exception:  # Un archivo con errores no detiene al publicador; se reintenta si cambia
+                    self.published[signature] = None
+                    publish_logger.exception("Error al publicar %s", os.path.basename(path))
+            if self.published[signature] is not None:
+                keys.append(self.published[signature])
+        return keys
+
+    def publish_file(self, path):
+        # Misma llave que usa la app para el archivo, de modo que el caché en disco se comparte
+        key = path_hash(path)
+        if key not in list_published():
+            start = time.perf_counter()
+            data = get_processed_data(path, key, label=os.path.basename(path))
+            publish_dataset(data, key, os.path.basename(path), origen=os.path.abspath(path))
+            publish_logger.info("Publicado %s en %.1f s", os.path.basename(path), time.perf_counter() - start)
+        return key
+
+@st.cache_resource
+def get_publisher(watch_dir):
+    return Publisher(watch_dir)
+
+def render_viewer():
+    # Modo visor: solo lectura de reportes publicados, sin cargar ni procesar archivos
+    published = list_published()
+    if not published:
+        st.warning("AÚN NO HAY REPORTES PUBLICADOS ❗❗")
+        st.stop()
+    key = st.sidebar.selectbox("REPORTE", list(published), format_func=lambda key: published[key]["etiqueta"])
+    manifest = published[key]
+    zona = st.sidebar.selectbox("ZONA", [ALL_ZONES_LABEL] + manifest["zonas"])
+    zona = None if zona == ALL_ZONES_LABEL else zona
+    
+    tab_names = manifest["pestañas"]
+    tabs = st.tabs(tab_names, key="tab_activa", on_change="rerun")
+    for tab, tab_name in zip(tabs, tab_names):
+        if tab.open is False:
+            continue
+        with tab:
+            path = os.path.join(PUBLISH_DIR, key, snapshot_name(tab_name, zona))
+            try:
+                columns = load_snapshot(path, os.path.getmtime(path))
+            except OSError:
+                st.error("REPORTE NO DISPONIBLE ❗❗")
+                continue
+            for col, (spec_key, header, fig_map, fig_histogram, df_table) in zip(st.columns(3), columns):
+                with col:
+                    column_header(col, header)
+                    st.plotly_chart(fig_map, use_container_width=True, key=f"visor_fig{spec_key}_key")
+                    st.plotly_chart(fig_histogram, use_container_width=True, key=f"visor_fig_histogram_{spec_key}_key")
+                    st.write(df_table)
+
 def main():
     # Configura la página y carga los datos
     configure_page()
-    df_loaded = load_data()
+    if PUBLISH_ENABLED and WATCH_DIR:
+        # Una sola instancia por proceso del servidor; arranca con la primera visita
+        get_publisher(WATCH_DIR)
+    if APP_MODE == "visor":
+        render_viewer()
+        return
+    diagnostics = None
+    if st.sidebar.toggle("DIAGNÓSTICO", value=DIAGNOSTICS_ENABLED,
+                         help="Mide el tiempo, la memoria y el tamaño de las figuras de cada etapa"):
+        diagnostics = Diagnostics()
+    _active_diagnostics.current = diagnostics
+    try:
+        render_app()
+    finally:
+        if diagnostics:
+            diagnostics.close()
+    if diagnostics:
+        render_diagnostics(diagnostics)
+
+def render_app():
+    # Carga el archivo, lo procesa y dibuja la pestaña abierta
+    with diagnostic_stage("load_data") as detail:
+        source, file_name, base_key = load_data()
+        if isinstance(source, str):
+            stat = os.stat(source)
+            detail["bytes"] = stat.st_size
+            dataset_key = source_key(source, stat.st_size, stat.st_mtime, base_key)
+        else:
+            detail["bytes"] = source.size
+            dataset_key = upload_key(source, base_key)
     
     with st.spinner("Procesando datos..."):
-        df_pozos, df_data,df_data_corte,df_diaria_actual, merged_data, polygon_lats, polygon_lons, zoom = process_data(df_loaded)
+        label = file_name if base_key is None else f"{list_cached_datasets().get(base_key, base_key[:12])} + {file_name}"
+        # Una sola copia en memoria de cada archivo procesado, compartida por todas las sesiones
+        session_id = st.session_state.setdefault("session_id", uuid.uuid4().hex)
+        try:
+            if HISTORY_BACKEND == "parquet":
+                # Solo se procesan las zonas seleccionadas, leyendo sus particiones de la historia
+                history = get_history(dataset_key, source)
+                ms_zona = st.sidebar.multiselect("SELECCIONA EL/LAS ZONA(S)", history.zones(), default=[])
+                if not ms_zona:
+                    st.warning("SELECCIONA EL/LAS ZONA(S) ❗❗")
+                    st.stop()
+                data_key = subset_key(dataset_key, ms_zona)
+                data = get_dataset_store().acquire(data_key, session_id,
+                                                   lambda: get_subset_data(history, data_key, ms_zona, label))
+                ms_zona = zone_values(ms_zona)
+                df_wells = history.wells()
+            else:
+                data = get_dataset_store().acquire(
+                    dataset_key, session_id,
+                    lambda: get_processed_data(source, dataset_key, base_key, label))
+                ms_zona = st.sidebar.multiselect("SELECCIONA EL/LAS ZONA(S)", data.df_pozos["ZONA"].unique(), default=[])
+                df_wells = data.df_pozos
+            pozos = spatial_selection(dataset_key, df_wells)
+        except ValueError as error:
+            st.error(f"{error} ❗❗")
+            st.stop()
+        with diagnostic_stage("get_static_layers"):
+            static_layers = get_static_layers(dataset_key, df_wells, data.polygon_lats, data.polygon_lons)
         
-        # Crea las pestañas de la interfaz
-        tabs = st.tabs(["ACUMULADA TOTAL", "ACUMULADA NORMALIZADA", "PRODUCCIÓN ACTUAL"])
+        # Crea las pestañas de la interfaz; solo se construye el contenido de la pestaña abierta
+        tab_names = list(TAB_SPECS)
+        tabs = st.tabs(tab_names, key="tab_activa", on_change="rerun")
         
         # Filtros desde la barra lateral
-        ms_zona = st.sidebar.multiselect("SELECCIONA EL/LAS ZONA(S)", df_pozos["ZONA"].unique(), default=[])
-                
-        df_data_seleccion = df_data[df_data["ZONA"].isin(ms_zona)]
-        df_data_selection_norm = df_data_corte[df_data_corte["ZONA"].isin(ms_zona)]
-        df_data_selection_diaria = df_diaria_actual[df_diaria_actual["ZONA"].isin(ms_zona)]
-        df_tablas_resumen = merged_data[merged_data["ZONA"].isin(ms_zona)]
-        
+        cortes = available_cutoffs(data) or [MESES_CORTE]
+        meses_corte = st.sidebar.select_slider("MESES PARA NORMALIZAR LA ACUMULADA", options=cortes,
+                                               value=min(cortes, key=lambda meses: abs(meses - MESES_CORTE)))
+        prebinned = st.sidebar.toggle("GRÁFICOS PRECALCULADOS", value=True,
+                                      help="Calcula histogramas y mapas de densidad en el servidor para reducir el tamaño de las figuras")
+        figure_key = (dataset_key, frozenset(ms_zona), selection_key(pozos))
+        # Publicación manual del archivo cargado para el modo visor (requiere el archivo completo en memoria)
+        if HISTORY_BACKEND == "memoria" and st.sidebar.button("PUBLICAR PARA VISORES"):
+            with diagnostic_stage("publish_dataset"):
+                publish_dataset(data, dataset_key, label, meses_corte)
+            st.sidebar.success("REPORTE PUBLICADO")
         
-        # Pestaña "PRODUCCIÓN ACUMULADA"
-        with tabs[0]:         
-            # Crear histogramas para cada variable
-            fig_histogram_Np = px.histogram(df_data_seleccion, x='NP Mbbl', nbins=40, title="Histograma de AceiteAcumulado")
-            fig_histogram_Wp = px.histogram(df_data_seleccion, x='WP Mbbl', nbins=40, title="Histograma de AguaAcumulada")
-            fig_histogram_Gp = px.histogram(df_data_seleccion, x='GP MMcf', nbins=40, title="Histograma de GasAcumulado")
-            
-            # Configuración de color y estilo de los gráficos
-            histogram_style = dict(
-                plot_bgcolor="white",
-                font=dict(family='Arial', size=12, color='black'),
-                xaxis_title_font=dict(size=12, color='black', family='Arial'),
-                yaxis_title_font=dict(size=12, color='black', family='Arial'),
-                height=200,
-                width=190,
-                margin=dict(l=20, r=170, t=40, b=20)  # Ajustar márgenes para mejor visualización
-            )
-            
-            # Configuración de cada histograma con título centrado y colores específicos
-            fig_histogram_Np.update_layout(
-                **histogram_style,
-                title=dict(text="Histograma de Aceite Acumulado", x=0.2, font=dict(size=16, color='black', family='Arial')),
-                yaxis_title="Total del Pozos"
-            )
-            fig_histogram_Np.update_traces(marker_color='green', marker_line_color='black', marker_line_width=0.5)
-            
-            fig_histogram_Wp.update_layout(
-                **histogram_style,
-                title=dict(text="Histograma de Agua Acumulada", x=0.2, font=dict(size=16, color='black', family='Arial')),
-                yaxis_title="Total del Pozos"
-            )
-            fig_histogram_Wp.update_traces(marker_color='blue', marker_line_color='black', marker_line_width=0.5)
-            
-            fig_histogram_Gp.update_layout(
-                **histogram_style,
-                title=dict(text="Histograma de Gas Acumulado", x=0.2, font=dict(size=16, color='black', family='Arial')),
-                yaxis_title="Total del Pozos"
-            )
-            fig_histogram_Gp.update_traces(marker_color='orange', marker_line_color='black', marker_line_width=0.5)
-            
-
-            # Mostrar en cuatro columnas
-            col1, col2, col3 = st.columns(3)
-            with col1:
-            # Mostrar el mapa (ya sea filtrado o no)
-                col1.markdown("""<h3 style='text-align:center; font-family:Arial;
-                              font-size:18px; color:#333333;'>ACEITE ACUMULADO TOTAL (Mbbl)</h3>""",
-                    unsafe_allow_html=True
-                )
-                figNp = plot_density_map(df_data_seleccion, df_pozos, "NP Mbbl", polygon_lats, polygon_lons, 'turbo', zoom)
-                st.plotly_chart(figNp, use_container_width=True, key="figNp_key")
-                st.plotly_chart(fig_histogram_Np, use_container_width=True, key="fig_histogram_Np_key")
-                selected_columnsNP = ["POZO", "ZONA", 'MESES ACTIVO', 'NP Mbbl']
-                st.write(df_tablas_resumen[selected_columnsNP])
-                            
-            with col2:
-            # Mostrar el mapa (ya sea filtrado o no)
-                col2.markdown("""<h3 style='text-align:center; font-family:Arial;
-                              font-size:18px; color:#333333;'>AGUA ACUMULADA TOTAL (Mbbl)</h3>""",
-                    unsafe_allow_html=True
-                )
-                figWp = plot_density_map(df_data_seleccion, df_pozos, "WP Mbbl", polygon_lats, polygon_lons, 'turbo', zoom)
-                st.plotly_chart(figWp, use_container_width=True, key="figWp_key")
-                st.plotly_chart(fig_histogram_Wp, use_container_width=True, key="fig_histogram_Wp_key")
-                selected_columnsWP = ["POZO", "ZONA", 'MESES ACTIVO', 'WP Mbbl']
-                st.write(df_tablas_resumen[selected_columnsWP])
-                
-            with col3:
-            # Mostrar el mapa (ya sea filtrado o no)
-                col3.markdown("""<h3 style='text-align:center; font-family:Arial;
-                              font-size:18px; color:#333333;'>GAS ACUMULADO TOTAL (MMcf)</h3>""",
-                    unsafe_allow_html=True
-                )
-                figGp = plot_density_map(df_data_seleccion, df_pozos, "GP MMcf", polygon_lats, polygon_lons, 'turbo', zoom)
-                st.plotly_chart(figGp, use_container_width=True, key="figGp_key") 
-                st.plotly_chart(fig_histogram_Gp, use_container_width=True, key="fig_histogram_Gp_key")
-                selected_columnsGP = ["POZO", "ZONA", 'MESES ACTIVO', 'GP MMcf']
-                st.write(df_tablas_resumen[selected_columnsGP])
-                
-            # Pestaña "PRODUCCIÓN ACUMULADA NORMALIZADA"
-            with tabs[1]:         
-                # Crear histogramas para cada variable
-                fig_histogram_Np_corte = px.histogram(df_data_selection_norm, x='NP Mbbl', nbins=40, title="Histograma de Aceite Acumulado")
-                fig_histogram_Wp_corte = px.histogram(df_data_selection_norm, x='WP Mbbl', nbins=40, title="Histograma de Agua Acumulada")
-                fig_histogram_Gp_corte = px.histogram(df_data_selection_norm, x='GP MMcf', nbins=40, title="Histograma de Gas Acumulado")
-                
-                # Configuración de color y estilo de los gráficos
-                histogram_style = dict(
-                    plot_bgcolor="white",
-                    font=dict(family='Arial', size=12, color='black'),
-                    xaxis_title_font=dict(size=12, color='black', family='Arial'),
-                    yaxis_title_font=dict(size=12, color='black', family='Arial'),
-                    height=200,
-                    width=190,
-                    margin=dict(l=20, r=170, t=40, b=20)  # Ajustar márgenes para mejor visualización
-                )
-                
-                # Configuración de cada histograma con título centrado y colores específicos
-                fig_histogram_Np_corte.update_layout(
-                    **histogram_style,
-                    title=dict(text="Histograma de Aceite Acumulado Normalizado", x=0.2, font=dict(size=16, color='black', family='Arial')),
-                    yaxis_title="Total del Pozos"
-                )
-                fig_histogram_Np_corte.update_traces(marker_color='green', marker_line_color='black', marker_line_width=0.5)
-                
-                fig_histogram_Wp_corte.update_layout(
-                    **histogram_style,
-                    title=dict(text="Histograma de Agua Acumulada Normalizada", x=0.2, font=dict(size=16, color='black', family='Arial')),
-                    yaxis_title="Total del Pozos"
-                )
-                fig_histogram_Wp_corte.update_traces(marker_color='blue', marker_line_color='black', marker_line_width=0.5)
-                
-                fig_histogram_Gp_corte.update_layout(
-                    **histogram_style,
-                    title=dict(text="Histograma de Gas Acumulado Normalizado", x=0.2, font=dict(size=16, color='black', family='Arial')),
-                    yaxis_title="Total del Pozos"
-                )
-                fig_histogram_Gp_corte.update_traces(marker_color='orange', marker_line_color='black', marker_line_width=0.5)
-                
-    
-            # Mostrar en cuatro columnas
-                col1, col2, col3 = st.columns(3)
-                with col1:
-                # Mostrar el mapa (ya sea filtrado o no)
-                    col1.markdown("""<h3 style='text-align:center; font-family:Arial;
-                                  font-size:18px; color:#333333;'>ACEITE ACUMULADO NORMALIZADO A 12 MESES (Mbbl)</h3>""",
-                        unsafe_allow_html=True
-                    )
-                    figNpc = plot_density_map(df_data_selection_norm, df_pozos, "NP Mbbl", polygon_lats, polygon_lons, 'turbo', zoom)
-                    st.plotly_chart(figNpc, use_container_width=True, key="figNpc_key")
-                    st.plotly_chart(fig_histogram_Np_corte, use_container_width=True, key="fig_histogram_Np_corte_key")
-                    selected_columnsNP = ["POZO", "ZONA", 'MESES ACTIVO', 'NP Mbbl']
-                    st.write(df_data_selection_norm[selected_columnsNP])
-                                
-                with col2:
-                # Mostrar el mapa (ya sea filtrado o no)
-                    col2.markdown("""<h3 style='text-align:center; font-family:Arial;
-                                  font-size:18px; color:#333333;'>AGUA ACUMULADA NORMALIZADA A 12 MESES (Mbbl)</h3>""",
-                        unsafe_allow_html=True
-                    )
-                    figWpc = plot_density_map(df_data_selection_norm, df_pozos, "WP Mbbl", polygon_lats, polygon_lons, 'turbo', zoom)
-                    st.plotly_chart(figWpc, use_container_width=True, key="figWpc_key")
-                    st.plotly_chart(fig_histogram_Wp_corte, use_container_width=True, key="fig_histogram_Wp_corte_key")
-                    selected_columnsWP = ["POZO", "ZONA", 'MESES ACTIVO', 'WP Mbbl']
-                    st.write(df_data_selection_norm[selected_columnsWP])
-                    
-                with col3:
-                # Mostrar el mapa (ya sea filtrado o no)
-                    col3.markdown("""<h3 style='text-align:center; font-family:Arial;
-                                  font-size:18px; color:#333333;'>GAS ACUMULADO NORMALIZADO A 12 MESES  (MMcf)</h3>""",
-                        unsafe_allow_html=True
-                    )
-                    figGpc = plot_density_map(df_data_selection_norm, df_pozos, "GP MMcf", polygon_lats, polygon_lons, 'turbo', zoom)
-                    st.plotly_chart(figGpc, use_container_width=True, key="figGpc_key") 
-                    st.plotly_chart(fig_histogram_Gp_corte, use_container_width=True, key="fig_histogram_Gp_corte_key")
-                    selected_columnsGP = ["POZO", "ZONA", 'MESES ACTIVO', 'GP MMcf']
-                    st.write(df_data_selection_norm[selected_columnsGP])
-                    
-
-                # Pestaña "PRODUCCIÓN DIARIA ACTUAL"
-                with tabs[2]:         
-                    # Crear histogramas para cada variable
-                    fig_histogram_Qo = px.histogram(df_data_selection_diaria, x='ACEITE DIARIO BPD', nbins=40, title="Histograma de Aceite Diario")
-                    fig_histogram_Qw = px.histogram(df_data_selection_diaria, x='AGUA DIARIA BPD', nbins=40, title="Histograma de Agua Diaria")
-                    fig_histogram_Qg = px.histogram(df_data_selection_diaria, x='GAS DIARIO MMcfd', nbins=40, title="Histograma de Gas Diario")
-                    
-                    # Configuración de color y estilo de los gráficos
-                    histogram_style = dict(
-                        plot_bgcolor="white",
-                        font=dict(family='Arial', size=12, color='black'),
-                        xaxis_title_font=dict(size=12, color='black', family='Arial'),
-                        yaxis_title_font=dict(size=12, color='black', family='Arial'),
-                        height=200,
-                        width=190,
-                        margin=dict(l=20, r=170, t=40, b=20)  # Ajustar márgenes para mejor visualización
-                    )
-                    
-                    # Configuración de cada histograma con título centrado y colores específicos
-                    fig_histogram_Qo.update_layout(
-                        **histogram_style,
-                        title=dict(text="Histograma de Aceite Diario", x=0.2, font=dict(size=16, color='black', family='Arial')),
-                        yaxis_title="Total del Pozos"
-                    )
-                    fig_histogram_Qo.update_traces(marker_color='green', marker_line_color='black', marker_line_width=0.5)
-                    
-                    fig_histogram_Qw.update_layout(
-                        **histogram_style,
-                        title=dict(text="Histograma de Agua Diaria", x=0.2, font=dict(size=16, color='black', family='Arial')),
-                        yaxis_title="Total del Pozos"
-                    )
-                    fig_histogram_Qw.update_traces(marker_color='blue', marker_line_color='black', marker_line_width=0.5)
-                    
-                    fig_histogram_Qg.update_layout(
-                        **histogram_style,
-                        title=dict(text="Histograma de Gas Diario", x=0.2, font=dict(size=16, color='black', family='Arial')),
-                        yaxis_title="Total del Pozos"
-                    )
-                    fig_histogram_Qg.update_traces(marker_color='orange', marker_line_color='black', marker_line_width=0.5)
-                    
-        
-                # Mostrar en cuatro columnas
-                    col1, col2, col3 = st.columns(3)
-                    with col1:
-                    # Mostrar el mapa (ya sea filtrado o no)
-                        col1.markdown("""<h3 style='text-align:center; font-family:Arial;
-                                      font-size:18px; color:#333333;'>ACEITE DIARIO (BPD)</h3>""",
-                            unsafe_allow_html=True
-                        )
-                        figQo_diario = plot_density_map(df_data_selection_diaria, df_pozos, "ACEITE DIARIO BPD", polygon_lats, polygon_lons, 'turbo', zoom)
-                        st.plotly_chart(figQo_diario, use_container_width=True, key="figQo_diario_key")
-                        st.plotly_chart(fig_histogram_Qo, use_container_width=True, key="fig_histogram_Qo_key")
-                        selected_columnsQo = ["POZO", "ZONA", 'FECHA', 'ACEITE DIARIO BPD']
-                        st.write(df_data_selection_diaria[selected_columnsQo])
-                                    
-                    with col2:
-                    # Mostrar el mapa (ya sea filtrado o no)
-                        col2.markdown("""<h3 style='text-align:center; font-family:Arial;
-                                      font-size:18px; color:#333333;'>AGUA DIARIA (BPD)</h3>""",
-                            unsafe_allow_html=True
-                        )
-                        figQw_diario = plot_density_map(df_data_selection_diaria, df_pozos, "AGUA DIARIA BPD", polygon_lats, polygon_lons, 'turbo', zoom)
-                        st.plotly_chart(figQw_diario, use_container_width=True, key="figQw_diario_key")
-                        st.plotly_chart(fig_histogram_Qw, use_container_width=True, key="fig_histogram_Qw_key")
-                        selected_columnsQw = ["POZO", "ZONA", 'FECHA', 'AGUA DIARIA BPD']
-                        st.write(df_data_selection_diaria[selected_columnsQw])
-                        
-                    with col3:
-                    # Mostrar el mapa (ya sea filtrado o no)
-                        col3.markdown("""<h3 style='text-align:center; font-family:Arial;
-                                      font-size:18px; color:#333333;'>GAS DIARIO  (MMcfd)</h3>""",
-                            unsafe_allow_html=True
-                        )
-                        figQg_diario = plot_density_map(df_data_selection_diaria, df_pozos, "GAS DIARIO MMcfd", polygon_lats, polygon_lons, 'turbo', zoom)
-                        st.plotly_chart(figQg_diario, use_container_width=True, key="figQg_diario_key") 
-                        st.plotly_chart(fig_histogram_Qg, use_container_width=True, key="fig_histogram_Qg_key")
-                        selected_columnsQg = ["POZO", "ZONA", "FECHA", "GAS DIARIO MMcfd"]
-                        df_data_selection_diaria["RGA Mcfb"] = (df_data_selection_diaria["GAS DIARIO MMcfd"] * 1000) / df_data_selection_diaria["ACEITE DIARIO BPD"]
-                        selected_columnsQg.append("RGA Mcfb")
-                        st.write(df_data_selection_diaria[selected_columnsQg])
+        for tab, tab_name in zip(tabs, tab_names):
+            # Con on_change="rerun" open indica la pestaña activa (None solo sin seguimiento de estado);
+            # st.tabs acepta key y on_change desde Streamlit 1.55, ver requirements.txt
+            if tab.open is False:
+                continue
+            with tab:
+                fecha = None
+                if tab_name == "ACUMULADA NORMALIZADA":
+                    tab_key = (*figure_key, meses_corte)
+                elif tab_name in DAILY_TABS:
+                    # Fecha de la foto de producción diaria (por omisión, la fecha de corte OFM)
+                    fechas = [pd.Timestamp(fecha) for fecha in data.diaria_fechas]
+                    if len(fechas) > 1:
+                        fecha = st.select_slider("FECHA DE PRODUCCIÓN", options=fechas, value=fechas[-1],
+                                                 key=f"fecha_{tab_name}",
+                                                 format_func=lambda fecha: fecha.strftime("%m/%Y"))
+                    tab_key = (*figure_key, fecha)
+                else:
+                    tab_key = figure_key
+                with diagnostic_stage(f"render_tab {tab_name}"):
+                    df_tab, df_table = tab_frames(data, tab_name, meses_corte, fecha)
+                    render_tab(tab_name, select_wells(df_tab, ms_zona, pozos), select_wells(df_table, ms_zona, pozos),
+                               tab_key, static_layers, data.zoom, prebinned, meses_corte)
+                render_well_history(data, df_wells, tab_name)
                         
                         
     
@@ -0,0 +1,10 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+
+from streamlit.logger import set_log_level
+
+# Los módulos de la app están en la raíz del repositorio; fuera del servidor de Streamlit los cachés
+# avisan que no hay runtime, lo que no aplica en las pruebas
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+set_log_level("error")
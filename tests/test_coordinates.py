@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+"""
+Tabla memoizada de coordenadas proyectadas (CoordinateTable).
+"""
+
+import numpy as np
+import pandas as pd
+
+import ACM_DISTRIBUCION_PROD as acm
+
+def utm(x, y):
+    return pd.DataFrame({"WGS84_UTMX_OBJETIVO": x, "WGS84_UTMY_OBJETIVO": y})
+
+def new_table():
+    return acm.CoordinateTable(acm.get_coordinate_table().transformer)
+
+def direct(coords):
+    lon, lat = acm.get_coordinate_table().transformer.transform(coords["WGS84_UTMX_OBJETIVO"].to_numpy(),
+                                                                coords["WGS84_UTMY_OBJETIVO"].to_numpy())
+    return lat, lon
+
+def test_empty_coordinates_stay_aligned_across_calls():
+    coords = utm([630000, np.nan, 631000, 630000, 632000], [2300000, 2301000, np.nan, 2300000, 2302000])
+    table = new_table()
+    lat, lon = direct(coords)
+    for _ in range(3):
+        projected = table.project(coords)
+        assert len(projected) == len(coords)
+        np.testing.assert_allclose(projected["Latitude"], lat)
+        np.testing.assert_allclose(projected["Longitude"], lon)
+    # Solo se guardan los pares finitos, una vez cada uno
+    assert len(table.table) == 2
+
+def test_reset_keeps_pairs_used_by_the_call(monkeypatch):
+    table = new_table()
+    table.project(utm([630000, 631000], [2300000, 2300000]))
+    monkeypatch.setattr(acm, "COORDINATE_TABLE_MAX_ROWS", 2)
+    coords = utm([630000, 640000, 641000], [2300000, 2300000, 2300000])
+    projected = table.project(coords)
+    np.testing.assert_allclose(projected["Latitude"], direct(coords)[0])
+    assert not projected.isna().any().any()
+
+def test_add_latlon_with_empty_coordinates_in_repeated_process_data():
+    # Un pozo sin coordenadas no desplaza las coordenadas de los demás en cargas posteriores
+    frame = utm([630000, np.nan, 631000], [2300000, np.nan, 2301000])
+    for _ in range(2):
+        frames = [frame.copy(), frame.iloc[::-1].copy()]
+        acm.add_latlon(frames, acm.get_coordinate_table())
+        for df in frames:
+            lat, _ = direct(df)
+            np.testing.assert_allclose(df["Latitude"], lat)
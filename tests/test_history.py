@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+"""
+Historia mensual en Parquet particionada por ZONA (backend opcional).
+"""
+
+import io
+
+import numpy as np
+import pytest
+
+import ACM_BENCHMARK as bench
+import ACM_DISTRIBUCION_PROD as acm
+
+pytest.importorskip("pyarrow")
+
+@pytest.fixture
+def history(tmp_path, monkeypatch):
+    monkeypatch.setattr(acm, "HISTORY_DIR", str(tmp_path))
+    df = bench.generate_ofm(60, disparos_max=2, n_zonas=3, meses=12, seed=4)
+    df.loc[np.random.default_rng(5).choice(len(df), 21, replace=False), "ZONA"] = np.nan
+    raw = df.to_csv(index=False).encode()
+    return acm.HistoryDataset(acm.ingest_history(raw, "historia")), acm.read_ofm_csv(io.BytesIO(raw))
+
+def test_rows_without_zone_are_reachable(history):
+    dataset, df_loaded = history
+    zonas = dataset.zones()
+    assert acm.NO_ZONE_LABEL in zonas
+    assert len(dataset.load([acm.NO_ZONE_LABEL])) == df_loaded["ZONA"].isna().sum() == 21
+    assert len(dataset.load(zonas)) == len(df_loaded)
+
+def test_zone_selection_matches_memory_backend(history):
+    dataset, df_loaded = history
+    seleccion = [dataset.zones()[0], acm.NO_ZONE_LABEL]
+    df_zonas = dataset.load(seleccion)
+    assert len(acm.select_wells(df_zonas, acm.zone_values(seleccion))) == len(df_zonas)
+    assert len(df_zonas) == df_loaded["ZONA"].isin(acm.zone_values(seleccion)).sum()
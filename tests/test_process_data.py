@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+"""
+Equivalencia de process_data con la cadena original de groupbys y de append_delta con un
+procesamiento completo, sobre exportaciones sintéticas de ACM_BENCHMARK.generate_ofm.
+"""
+
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import ACM_BENCHMARK as bench
+import ACM_DISTRIBUCION_PROD as acm
+
+SHOT_GROUP = ["POZO", "POZO ID", "ZONA", "WGS84_UTMX_OBJETIVO", "WGS84_UTMY_OBJETIVO"]
+WELL_GROUP = ["POZO", "ZONA", "WGS84_UTMX_OBJETIVO", "WGS84_UTMY_OBJETIVO"]
+CUM = ['NP Mbbl', 'WP Mbbl', 'GP MMcf']
+RATES = ['ACEITE DIARIO BPD', 'AGUA DIARIA BPD', 'GAS DIARIO MMcfd']
+
+def baseline_process_data(df_loaded, meses_corte=acm.MESES_CORTE):
+    # Cadena de groupbys de la versión original de process_data (sin la proyección a lat/lon)
+    df_loaded['FECHA'] = pd.to_datetime(df_loaded['FECHA'], format=acm.OFM_DATE_FORMAT)
+
+    df_acumulada_tabla_max = df_loaded.groupby(["POZO", "POZO ID", "ZONA"])[CUM].max().reset_index()
+    df_acumulada_tabla_sum = df_acumulada_tabla_max.groupby(["POZO", "ZONA"])[CUM].sum().reset_index()
+    df_meses_max = df_loaded.groupby(["POZO", "POZO ID", "ZONA"])[['MESES ACTIVO']].max().reset_index()
+    df_meses_sum = df_meses_max.groupby(["POZO", "ZONA"])[['MESES ACTIVO']].max().reset_index()
+    merged_data = pd.merge(df_acumulada_tabla_sum, df_meses_sum, on=["POZO", "ZONA"], how="inner")
+
+    df_acumulada_max = df_loaded.groupby(SHOT_GROUP)[['MESES ACTIVO'] + CUM].max().reset_index()
+    df_data = df_acumulada_max.groupby(WELL_GROUP + ['MESES ACTIVO'])[CUM].sum().reset_index()
+
+    df_corte = df_loaded[df_loaded['MESES ACTIVO'] == meses_corte]
+    df_normalizada = df_corte.groupby(SHOT_GROUP)[['MESES ACTIVO'] + CUM].max().reset_index()
+    df_data_corte = df_normalizada.groupby(WELL_GROUP + ['MESES ACTIVO'])[CUM].sum().reset_index()
+
+    df_fecha_corte = df_loaded[df_loaded['FECHA'] == df_loaded['FECHA'].max()]
+    df_diaria_disparo = df_fecha_corte.groupby(SHOT_GROUP + ['FECHA'])[RATES].max().reset_index()
+    df_diaria_actual = df_diaria_disparo.groupby(WELL_GROUP + ['FECHA'])[RATES].sum().reset_index()
+
+    df_pozos = df_loaded[WELL_GROUP].drop_duplicates()
+    return dict(df_pozos=df_pozos, df_data=df_data, df_data_corte=df_data_corte,
+                df_diaria_actual=df_diaria_actual, merged_data=merged_data)
+
+def assert_same_rows(actual, expected):
+    # Mismas filas y valores en las columnas de expected, sin importar el orden ni los tipos
+    # (categorías, float32) de la versión optimizada
+    def normalize(df):
+        df = df[list(expected.columns)].copy()
+        for col in df.columns:
+            if pd.api.types.is_numeric_dtype(df[col]):
+                df[col] = df[col].astype("float64")
+            elif not pd.api.types.is_datetime64_any_dtype(df[col]):
+                df[col] = df[col].astype(object).where(df[col].notna(), None)
+        return df.sort_values(list(df.columns), na_position="last", ignore_index=True)
+    pd.testing.assert_frame_equal(normalize(actual), normalize(expected), check_dtype=False, rtol=1e-5)
+
+def ofm_bytes(df):
+    return df.to_csv(index=False).encode()
+
+def load(raw):
+    return acm.read_ofm_csv(io.BytesIO(raw))
+
+@pytest.fixture(scope="module")
+def ofm():
+    return bench.generate_ofm(300, disparos_max=3, n_zonas=4, meses=36, seed=1)
+
+@pytest.fixture(scope="module")
+def ofm_with_gaps(ofm):
+    # Llaves y valores vacíos en filas al azar
+    df = ofm.copy()
+    rng = np.random.default_rng(2)
+    for col in ["POZO ID", "ZONA", "MESES ACTIVO", "NP Mbbl", "GAS DIARIO MMcfd"]:
+        df.loc[rng.choice(len(df), len(df) // 50, replace=False), col] = np.nan
+    return df
+
+@pytest.mark.parametrize("frame", ["ofm", "ofm_with_gaps"])
+def test_process_data_matches_chained_groupbys(frame, request):
+    raw = ofm_bytes(request.getfixturevalue(frame))
+    expected = baseline_process_data(pd.read_csv(io.BytesIO(raw)))
+    data = acm.process_data(load(raw))
+    for name, table in expected.items():
+        assert_same_rows(getattr(data, name), table)
+
+@pytest.mark.parametrize("meses_corte", [1, 6, 24])
+def test_cutoff_data_matches_filtered_groupby(ofm_with_gaps, meses_corte):
+    raw = ofm_bytes(ofm_with_gaps)
+    expected = baseline_process_data(pd.read_csv(io.BytesIO(raw)), meses_corte)["df_data_corte"]
+    assert_same_rows(acm.cutoff_data(acm.process_data(load(raw)), meses_corte), expected)
+
+@pytest.mark.parametrize("frame", ["ofm", "ofm_with_gaps"])
+@pytest.mark.parametrize("meses_delta", [1, 6])
+def test_append_delta_matches_full_processing(frame, meses_delta, request):
+    df = request.getfixturevalue(frame)
+    fechas = pd.to_datetime(df['FECHA'], format=acm.OFM_DATE_FORMAT)
+    corte = np.sort(fechas.unique())[-meses_delta]
+    incremental = acm.append_delta(acm.process_data(load(ofm_bytes(df[fechas < corte]))),
+                                   load(ofm_bytes(df[fechas >= corte])))
+    full = acm.process_data(load(ofm_bytes(df)))
+
+    for name in ["df_pozos", "df_data", "df_data_corte", "merged_data", "df_diaria_actual"]:
+        assert_same_rows(getattr(incremental, name), getattr(full, name))
+    assert acm.available_cutoffs(incremental) == acm.available_cutoffs(full)
+    for meses_corte in acm.available_cutoffs(full)[::7]:
+        assert_same_rows(acm.cutoff_data(incremental, meses_corte), acm.cutoff_data(full, meses_corte))
+    np.testing.assert_array_equal(incremental.diaria_fechas, full.diaria_fechas)
+    for fecha in full.diaria_fechas:
+        assert_same_rows(acm.daily_snapshot(incremental, fecha), acm.daily_snapshot(full, fecha))
+    pozo = str(full.df_pozos["POZO"].iloc[0])
+    assert_same_rows(acm.well_history(incremental, pozo), acm.well_history(full, pozo))
+
+def test_append_delta_rejects_loaded_dates(ofm):
+    data = acm.process_data(load(ofm_bytes(ofm)))
+    with pytest.raises(ValueError):
+        acm.append_delta(data, load(ofm_bytes(ofm[ofm['FECHA'] == ofm['FECHA'].iloc[0]])))
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""
+Índice espacial de los pozos: prueba punto-en-polígono, malla de pozos y lectura de polígonos,
+comparados con un recorrido directo de todas las aristas.
+"""
+
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import ACM_DISTRIBUCION_PROD as acm
+
+def brute_force_inside(x, y, rings):
+    # Regla par-impar punto por punto y arista por arista
+    inside = np.zeros(len(x), dtype=bool)
+    for k, (xk, yk) in enumerate(zip(x, y)):
+        for ring_x, ring_y in rings:
+            n = len(ring_x)
+            for i in range(n):
+                xi, yi, xj, yj = ring_x[i], ring_y[i], ring_x[i - 1], ring_y[i - 1]
+                if (yi > yk) != (yj > yk) and xk < xi + (yk - yi) * (xj - xi) / (yj - yi):
+                    inside[k] = not inside[k]
+    return inside
+
+def random_polygon(rng, center, radius, n_vertices):
+    # Polígono estrellado (simple) alrededor de center
+    angles = np.sort(rng.uniform(0, 2 * np.pi, n_vertices))
+    radii = rng.uniform(0.3, 1.0, n_vertices) * radius
+    return center[0] + radii * np.cos(angles), center[1] + radii * np.sin(angles)
+
+@pytest.fixture(scope="module")
+def wells():
+    rng = np.random.default_rng(7)
+    x, y = rng.uniform(629300, 643000, 3000), rng.uniform(2295100, 2305100, 3000)
+    x[:10] = np.nan  # Pozos sin coordenadas
+    return x, y
+
+@pytest.fixture(scope="module")
+def polygons():
+    rng = np.random.default_rng(8)
+    polygons = []
+    for _ in range(20):
+        center = (rng.uniform(629300, 643000), rng.uniform(2295100, 2305100))
+        outer = random_polygon(rng, center, rng.uniform(300, 4000), int(rng.integers(3, 40)))
+        # La mitad de los polígonos con un hueco (segundo anillo)
+        rings = [outer] if rng.random() < 0.5 else [outer, random_polygon(rng, center, 150, 8)]
+        polygons.append(rings)
+    return polygons
+
+def test_points_in_polygon_matches_brute_force(wells, polygons):
+    x, y = wells
+    for rings in polygons:
+        np.testing.assert_array_equal(acm.points_in_polygon(x, y, rings), brute_force_inside(x, y, rings))
+
+def test_well_grid_matches_brute_force(wells, polygons):
+    x, y = wells
+    expected = np.zeros(len(x), dtype=bool)
+    for rings in polygons:
+        expected |= brute_force_inside(x, y, rings)
+    for wells_per_cell in (1, acm.GRID_WELLS_PER_CELL, 10_000):
+        np.testing.assert_array_equal(acm.WellGrid(x, y, wells_per_cell).inside(polygons), expected)
+
+def test_read_polygons_csv_and_geojson(polygons):
+    rings = [polygons[0][0], polygons[1][0]]
+    df_vertices = pd.concat([pd.DataFrame({"POLIGONO": f"P{i}", "WGS84_UTMX_OBJETIVO": ring_x,
+                                           "WGS84_UTMY_OBJETIVO": ring_y})
+                             for i, (ring_x, ring_y) in enumerate(rings)])
+    from_csv = acm.read_polygons(df_vertices.to_csv(index=False).encode(), "poligonos.csv")
+    assert len(from_csv) == 2
+    for (ring_x, ring_y), polygon in zip(rings, from_csv):
+        np.testing.assert_allclose(polygon[0][0], ring_x)
+        np.testing.assert_allclose(polygon[0][1], ring_y)
+
+    transformer = acm.get_coordinate_table().transformer
+    features = []
+    for ring_x, ring_y in rings:
+        lon, lat = transformer.transform(ring_x, ring_y)
+        features.append({"type": "Feature", "properties": {},
+                         "geometry": {"type": "Polygon", "coordinates": [np.column_stack([lon, lat]).tolist()]}})
+    geojson = json.dumps({"type": "FeatureCollection", "features": features}).encode()
+    from_geojson = acm.read_polygons(geojson, "poligonos.geojson")
+    for (ring_x, ring_y), polygon in zip(rings, from_geojson):
+        np.testing.assert_allclose(polygon[0][0], ring_x, atol=1e-3)
+        np.testing.assert_allclose(polygon[0][1], ring_y, atol=1e-3)
+
+def test_read_polygons_rejects_files_without_polygons():
+    with pytest.raises(ValueError):
+        acm.read_polygons(b'{"type": "FeatureCollection", "features": []}', "vacio.geojson")